@@ -0,0 +1,99 @@
+"""Shared pieces of the test resource wrappers.
+
+Nothing here imports boto3.
+"""
+import logging
+import os
+import random
+
+log = logging.getLogger('awstestutils')
+
+TEST_NAME_PREFIX = 'test-'
+
+BROKER_ENV_VAR = 'AWSTESTUTILS_BROKER'
+
+
+def reduce_logging_output(level=logging.WARN):
+    """Reduce the amount of boto related logging messages.
+
+    Both boto3 and botocore can be quite verbose on DEBUG level. This helps
+    reduce logging output when debugging other dependencies.
+    """
+    log.info('setting boto related logging to %s' % level)
+    logging.getLogger('botocore').setLevel(level)
+    logging.getLogger('boto3').setLevel(level)
+
+
+def _boto3_resource(service_name, region_name=None):
+    """A boto3 resource, importing boto3 on first use."""
+    import boto3
+    return boto3.resource(service_name, region_name=region_name)
+
+
+def _boto3_client(service_name, region_name=None):
+    """A boto3 client, importing boto3 on first use."""
+    import boto3
+    return boto3.client(service_name, region_name=region_name)
+
+
+def _region_name(region_name=None):
+    """The region name, or the configured default region if None."""
+    if region_name is not None:
+        return region_name
+    import boto3
+    return boto3.session.Session().region_name
+
+
+def _broker_client(broker):
+    """The client of the resource broker to lease from, if any.
+
+    Positional parameter:
+    * the broker socket path. If None, the ``AWSTESTUTILS_BROKER`` environment
+      variable is used instead. If False, resources are never leased.
+    """
+    if broker is None:
+        broker = os.environ.get(BROKER_ENV_VAR)
+    if not broker:
+        return None
+    from awstestutils.broker import connect
+    return connect(broker)
+
+
+###############################################################################
+
+class LiveTestBoto3Resource:
+    """Base class for the Queue and Topic test wrappers.
+
+    The method ``exists()`` must be implemented for ``generate_name()`` to
+    work.
+    """
+
+    L_NAME = 1000000
+    U_NAME = 10000000
+
+    def _generate_test_name(self):
+        return '%s%s' % (TEST_NAME_PREFIX,
+                         str(random.randint(self.L_NAME, self.U_NAME)))
+
+    def exists(self, name):
+        """Whether the resource found by generated "name" exists or not."""
+        raise NotImplementedError()
+
+    def generate_name(self):
+        """Creates a safe name to run tests.
+
+        This method avoids the 60' delay between deleted queues.
+        """
+        name = self._generate_test_name()
+        while self.exists(name):
+            name = self._generate_test_name()
+        return name
+
+    def _is_error_call(self, response):
+        """Whether the API call had an error.
+
+        Positional parameter:
+        * the `request` response object returned by the API call.
+        """
+        status = response.get('ResponseMetadata', {}).get('HTTPStatusCode')
+        return status != 200
@@ -0,0 +1,595 @@
+"""Share test resources between processes through a local broker.
+
+When many test processes run on one host (``pytest -n 32``, several CI jobs)
+each one would create its own queues, topics, tables and buckets, and scan for
+free names on its own. The broker is a single process that owns those
+resources and leases them to the test processes over a Unix socket:
+
+    $ python -m awstestutils.broker --socket /tmp/awstestutils.sock --queues 8 &
+    $ AWSTESTUTILS_BROKER=/tmp/awstestutils.sock pytest -n 32
+
+With ``AWSTESTUTILS_BROKER`` set (or the ``broker`` parameter given) the
+context managers lease a resource from the broker instead of creating one, and
+give it back on exit. The broker resets a resource before leasing it again,
+reclaims the leases of clients that disconnect or stop sending heartbeats, and
+deletes every resource when it shuts down.
+
+The protocol is one JSON object per line, in both directions.
+"""
+import argparse
+import json
+import logging
+import os
+import signal
+import socket
+import socketserver
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from awstestutils.base import _region_name
+from awstestutils.dynamodb import LiveTestDynamoDBTable
+from awstestutils.s3 import LiveTestS3Bucket
+from awstestutils.sns import LiveTestTopicQueue
+from awstestutils.sqs import LiveTestQueue
+
+log = logging.getLogger('awstestutils.broker')
+
+DEFAULT_LEASE_TIMEOUT = 30
+DEFAULT_RESET_TIMEOUT = 60
+
+
+###############################################################################
+
+def _queue_is_empty(client, queue_url):
+    attributes = client.get_queue_attributes(QueueUrl=queue_url, AttributeNames=[
+        'ApproximateNumberOfMessages',
+        'ApproximateNumberOfMessagesNotVisible',
+        'ApproximateNumberOfMessagesDelayed',
+    ])['Attributes']
+    return not any(int(count) for count in attributes.values())
+
+
+def _reset_queue(queue):
+    """Remove the messages left in the queue by the previous lease.
+
+    PurgeQueue is no good here: it can take up to 60 seconds, and deletes the
+    messages the next lessee sends meanwhile. Instead, drain the queue with
+    long polling until a receive comes back empty and SQS counts no visible,
+    in flight or delayed messages. Messages left in flight become visible
+    again after their visibility timeout, so wait for that long at most.
+    """
+    client = queue.meta.client
+    queue_url = queue.url
+    visibility_timeout = int(client.get_queue_attributes(
+        QueueUrl=queue_url, AttributeNames=['VisibilityTimeout'],
+    )['Attributes']['VisibilityTimeout'])
+    deadline = time.monotonic() + visibility_timeout + 10
+    while True:
+        msgs = client.receive_message(
+            QueueUrl=queue_url, MaxNumberOfMessages=10,
+            WaitTimeSeconds=1).get('Messages', [])
+        if msgs:
+            client.delete_message_batch(QueueUrl=queue_url, Entries=[
+                {'Id': str(i), 'ReceiptHandle': msg['ReceiptHandle']}
+                for i, msg in enumerate(msgs)])
+        elif _queue_is_empty(client, queue_url):
+            return
+        elif time.monotonic() >= deadline:
+            raise RuntimeError('SQS queue still has messages in flight')
+
+
+def _reset_table(table):
+    """Delete the items left in the table by the previous lease."""
+    keys = [key['AttributeName'] for key in table.key_schema]
+    scan = {
+        'ProjectionExpression': ', '.join('#k%d' % i for i in range(len(keys))),
+        'ExpressionAttributeNames': {'#k%d' % i: key for i, key in enumerate(keys)},
+    }
+    with table.batch_writer() as batch:
+        while True:
+            page = table.scan(**scan)
+            for item in page['Items']:
+                batch.delete_item(Key={key: item[key] for key in keys})
+            if 'LastEvaluatedKey' not in page:
+                break
+            scan['ExclusiveStartKey'] = page['LastEvaluatedKey']
+
+
+def _create_queue(region_name, options):
+    manager = LiveTestQueue(region_name=region_name, broker=False)
+    manager.create_queue()
+    return manager, {
+        'queue_name': manager.queue_name,
+        'queue_url': manager.queue.url,
+    }
+
+
+def _create_topic_queue(region_name, options):
+    manager = LiveTestTopicQueue(region_name=region_name, broker=False)
+    manager.create_topic_and_queue()
+    return manager, {
+        'topic_name': manager.topic_name,
+        'topic_arn': manager.topic.arn,
+        'queue_name': manager.queue_name,
+        'queue_url': manager.queue.url,
+    }
+
+
+def _create_table(region_name, options):
+    manager = LiveTestDynamoDBTable(region_name=region_name, broker=False,
+                                    **options)
+    manager.create_table(
+        key_schema_definition=manager.key_schema_definition,
+        attribute_definitions=manager.attribute_definitions,
+        provisioned_throughput=manager.provisioned_throughput,
+        stream_view_type=manager.stream_view_type)
+    return manager, {'table_name': manager.table_name}
+
+
+def _create_bucket(region_name, options):
+    manager = LiveTestS3Bucket(region_name=region_name, broker=False,
+                               **options)
+    manager.create_bucket()
+    return manager, {'bucket_name': manager.bucket_name}
+
+
+def _default_options(kind, region_name):
+    """The options sent by a client with default settings.
+
+    Prefilled resources are pooled under these, so such clients lease them.
+    """
+    if kind == 'table':
+        manager = LiveTestDynamoDBTable(region_name=region_name, broker=False)
+        return {
+            'key_schema_definition': manager.key_schema_definition,
+            'attribute_definitions': manager.attribute_definitions,
+            'provisioned_throughput': manager.provisioned_throughput,
+            'stream_view_type': manager.stream_view_type,
+        }
+    if kind == 'bucket':
+        manager = LiveTestS3Bucket(region_name=region_name, broker=False)
+        return {'versioning': manager.versioning}
+    return {}
+
+
+# Per kind of resource: how to create it, reset it between leases and destroy it.
+KINDS = {
+    'queue': (_create_queue,
+              lambda manager: _reset_queue(manager.queue),
+              lambda manager: manager.destroy_queue()),
+    'topic_queue': (_create_topic_queue,
+                    lambda manager: _reset_queue(manager.queue),
+                    lambda manager: manager.destroy_topic_and_queue()),
+    'table': (_create_table,
+              lambda manager: _reset_table(manager.table),
+              lambda manager: manager.destroy_table()),
+    'bucket': (_create_bucket,
+               lambda manager: manager.empty(),
+               lambda manager: manager.destroy_bucket()),
+}
+
+
+class _Pooled:
+    """A resource owned by the broker, and the lease on it (if any)."""
+
+    def __init__(self, key, manager, description):
+        self.key = key
+        self.manager = manager
+        self.description = description
+        self.lease_id = None
+        self.heartbeat = None
+
+
+###############################################################################
+
+class _BrokerHandler(socketserver.StreamRequestHandler):
+    """Serve one client connection.
+
+    The leases granted on a connection are reclaimed when it closes, so a test
+    process that dies gives its resources back right away.
+    """
+
+    def handle(self):
+        broker = self.server.broker
+        leases = set()
+        try:
+            for line in self.rfile:
+                try:
+                    response = broker.dispatch(json.loads(line), leases)
+                except Exception as e:
+                    log.warning('request failed: %s' % e)
+                    response = {'error': str(e)}
+                self.wfile.write(json.dumps(response).encode() + b'\n')
+        except ConnectionError:
+            pass
+        finally:
+            for lease_id in leases:
+                broker.reclaim(lease_id)
+
+
+class _BrokerServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class ResourceBroker:
+    """Own test resources and lease them to other processes.
+
+    Resources are pooled by kind ("queue", "topic_queue", "table" or
+    "bucket"), region and options, created on demand (or up front with
+    ``prefill``) and kept until the broker shuts down.
+
+    Intended usage:
+
+        >>> broker = ResourceBroker('/tmp/awstestutils.sock')
+        >>> broker.serve_forever(prefill={'queue': 8})
+    """
+
+    def __init__(self, socket_path, region_name=None,
+                 lease_timeout=DEFAULT_LEASE_TIMEOUT):
+        """Setup the broker.
+
+        :param socket_path: Path of the Unix socket to listen on
+        :param region_name: Region for the prefilled resources
+        :param lease_timeout: Seconds without heartbeats before reclaiming a lease
+        """
+        self.socket_path = socket_path
+        self.region_name = region_name
+        self.lease_timeout = lease_timeout
+        self.ready = threading.Event()
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+        self._server = None
+        self._pooled = []
+        self._free = {}
+        self._leases = {}
+        self._resetting = set()
+
+    def _key(self, kind, region_name, options):
+        if kind not in KINDS:
+            raise ValueError('unknown resource kind: %s' % kind)
+        # A client leasing with region None means the default region.
+        return (kind, _region_name(region_name),
+                json.dumps(options, sort_keys=True))
+
+    def _create(self, key):
+        kind, region_name, options = key
+        create, _, _ = KINDS[kind]
+        pooled = _Pooled(key, *create(region_name, json.loads(options)))
+        with self._lock:
+            self._pooled.append(pooled)
+        log.info('created %s %s' % (kind, pooled.description))
+        return pooled
+
+    def _put_back(self, pooled):
+        """Reset the resource and make it available for the next lease."""
+        kind = pooled.key[0]
+        _, reset, destroy = KINDS[kind]
+        try:
+            reset(pooled.manager)
+        except Exception as e:
+            log.warning('could not reset %s %s, dropping it: %s'
+                        % (kind, pooled.description, e))
+            with self._lock:
+                self._resetting.discard(pooled)
+                if pooled in self._pooled:
+                    self._pooled.remove(pooled)
+            try:
+                destroy(pooled.manager)
+            except Exception as e:
+                log.warning('could not destroy %s: %s' % (pooled.description, e))
+            return
+        with self._lock:
+            self._resetting.discard(pooled)
+            if not self._stopped.is_set():
+                self._free.setdefault(pooled.key, []).append(pooled)
+                return
+            # The broker shut down meanwhile, and left this one to us.
+            if pooled not in self._pooled:
+                return
+            self._pooled.remove(pooled)
+        try:
+            destroy(pooled.manager)
+        except Exception as e:
+            log.warning('could not destroy %s: %s' % (pooled.description, e))
+
+    def lease(self, kind, region_name=None, options=None):
+        """Lease a resource, creating it if none is free.
+
+        Returns the lease id and a description of the resource.
+        """
+        if self._stopped.is_set():
+            raise RuntimeError('broker is shutting down')
+        key = self._key(kind, region_name, options or {})
+        with self._lock:
+            free = self._free.get(key)
+            pooled = free.pop() if free else None
+        if pooled is None:
+            pooled = self._create(key)
+        lease_id = uuid.uuid4().hex
+        with self._lock:
+            pooled.lease_id, pooled.heartbeat = lease_id, time.monotonic()
+            self._leases[lease_id] = pooled
+        return lease_id, pooled.description
+
+    def heartbeat(self, lease_id):
+        """Keep the lease alive."""
+        with self._lock:
+            pooled = self._leases.get(lease_id)
+            if pooled is None:
+                raise ValueError('unknown lease: %s' % lease_id)
+            pooled.heartbeat = time.monotonic()
+
+    def release(self, lease_id):
+        """Return the leased resource to the pool.
+
+        Resetting can be slow (emptying a bucket, scanning a table), so it runs
+        in the background; the resource is free again once it is reset.
+        """
+        with self._lock:
+            pooled = self._leases.pop(lease_id, None)
+            if pooled is None:
+                raise ValueError('unknown lease: %s' % lease_id)
+            pooled.lease_id, pooled.heartbeat = None, None
+            self._resetting.add(pooled)
+        # Not a daemon, so shutting down never kills a reset mid-call.
+        threading.Thread(target=self._put_back, args=(pooled,)).start()
+
+    def wait_until_reset(self, timeout=None):
+        """Wait until no released resource is being reset.
+
+        Returns whether every reset finished within ``timeout`` seconds.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                if not self._resetting:
+                    return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+
+    def reclaim(self, lease_id):
+        """Release the lease on behalf of a client that went away."""
+        try:
+            self.release(lease_id)
+        except ValueError:
+            # Already released or reclaimed.
+            return
+        log.warning('reclaimed lease %s' % lease_id)
+
+    def _reap(self):
+        """Reclaim the leases of clients that stopped sending heartbeats."""
+        while not self._stopped.wait(self.lease_timeout / 3):
+            deadline = time.monotonic() - self.lease_timeout
+            with self._lock:
+                expired = [lease_id for lease_id, pooled in self._leases.items()
+                           if pooled.heartbeat < deadline]
+            for lease_id in expired:
+                self.reclaim(lease_id)
+
+    def dispatch(self, request, leases):
+        """Answer a client request.
+
+        Positional parameters:
+        * the request, as sent by the client.
+        * the set of lease ids granted on the client's connection.
+        """
+        op = request.get('op')
+        if op == 'lease':
+            lease_id, description = self.lease(request['kind'],
+                                               request.get('region_name'),
+                                               request.get('options'))
+            leases.add(lease_id)
+            return {'lease': lease_id, 'resource': description,
+                    'heartbeat': self.lease_timeout / 3}
+        if op == 'heartbeat':
+            self.heartbeat(request['lease'])
+            return {}
+        if op == 'release':
+            leases.discard(request['lease'])
+            self.release(request['lease'])
+            return {}
+        if op == 'shutdown':
+            threading.Thread(target=self.shutdown).start()
+            return {}
+        raise ValueError('unknown operation: %s' % op)
+
+    def prefill(self, counts):
+        """Create resources up front, eg: ``{'queue': 8, 'table': 2}``."""
+        keys = [self._key(kind, self.region_name,
+                          _default_options(kind, self.region_name))
+                for kind, count in counts.items() for _ in range(count)]
+        with ThreadPoolExecutor(max_workers=max(len(keys), 1)) as executor:
+            for pooled in executor.map(self._create, keys):
+                with self._lock:
+                    self._free.setdefault(pooled.key, []).append(pooled)
+
+    def serve_forever(self, prefill=None, reset_timeout=DEFAULT_RESET_TIMEOUT):
+        """Serve clients until ``shutdown()``, then destroy every resource.
+
+        Resources being reset are destroyed once their reset is done; this
+        waits ``reset_timeout`` seconds at most for that.
+        """
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self._server = _BrokerServer(self.socket_path, _BrokerHandler)
+        self._server.broker = self
+        reaper = threading.Thread(target=self._reap, daemon=True)
+        reaper.start()
+        try:
+            if prefill:
+                self.prefill(prefill)
+            log.info('listening on %s' % self.socket_path)
+            self.ready.set()
+            self._server.serve_forever()
+        finally:
+            self._stopped.set()
+            self._server.server_close()
+            os.unlink(self.socket_path)
+            self.wait_until_reset(reset_timeout)
+            self._teardown()
+
+    def shutdown(self):
+        """Stop serving. Must not be called from the serving thread."""
+        self._stopped.set()
+        if self._server is not None:
+            self._server.shutdown()
+
+    def _teardown(self):
+        # Resources still being reset are destroyed by their reset thread.
+        with self._lock:
+            pooled = [resource for resource in self._pooled
+                      if resource not in self._resetting]
+            self._pooled = [resource for resource in self._pooled
+                            if resource in self._resetting]
+            self._free, self._leases = {}, {}
+        num_resources = 0
+        try:
+            for resource in pooled:
+                _, _, destroy = KINDS[resource.key[0]]
+                try:
+                    destroy(resource.manager)
+                    num_resources += 1
+                except Exception as e:
+                    log.warning('could not destroy %s: %s'
+                                % (resource.description, e))
+        finally:
+            log.info('deleted %s test resources' % num_resources)
+
+
+###############################################################################
+
+class BrokerClient:
+    """Lease resources from a ``ResourceBroker``.
+
+    The client keeps one connection to the broker for its leases, and sends
+    heartbeats from a background thread over a second connection, so they are
+    never stuck behind a slow lease. Prefer ``connect()``, which shares one
+    client per process.
+    """
+
+    def __init__(self, socket_path):
+        self.socket_path = socket_path
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.connect(socket_path)
+        self._file = self._sock.makefile('rwb')
+        self._lock = threading.Lock()
+        self._leases = set()
+        self._closed = threading.Event()
+        self._heartbeats = None
+
+    def _call(self, **request):
+        with self._lock:
+            line = self._send(self._file, request)
+        return self._response(line)
+
+    @staticmethod
+    def _send(file, request):
+        file.write(json.dumps(request).encode() + b'\n')
+        file.flush()
+        return file.readline()
+
+    @staticmethod
+    def _response(line):
+        if not line:
+            raise RuntimeError('broker closed the connection')
+        response = json.loads(line)
+        if 'error' in response:
+            raise RuntimeError('broker error: %s' % response['error'])
+        return response
+
+    def _send_heartbeats(self, interval):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(self.socket_path)
+        with sock, sock.makefile('rwb') as file:
+            while not self._closed.wait(interval):
+                for lease_id in list(self._leases):
+                    try:
+                        self._response(self._send(
+                            file, {'op': 'heartbeat', 'lease': lease_id}))
+                    except RuntimeError as e:
+                        log.warning('lost lease %s: %s' % (lease_id, e))
+                        self._leases.discard(lease_id)
+                    except (OSError, ValueError):
+                        # The client was closed.
+                        return
+
+    def lease(self, kind, region_name=None, **options):
+        """Lease a resource of the given kind.
+
+        Returns the lease id and a description of the resource.
+        """
+        # Resolve the default region here, it can differ from the broker's.
+        response = self._call(op='lease', kind=kind,
+                              region_name=_region_name(region_name),
+                              options=options)
+        self._leases.add(response['lease'])
+        if self._heartbeats is None:
+            self._heartbeats = threading.Thread(
+                target=self._send_heartbeats, args=(response['heartbeat'],),
+                daemon=True)
+            self._heartbeats.start()
+        return response['lease'], response['resource']
+
+    def release(self, lease_id):
+        """Give the resource back to the broker."""
+        self._leases.discard(lease_id)
+        self._call(op='release', lease=lease_id)
+
+    def shutdown_broker(self):
+        """Ask the broker to shut down and destroy its resources."""
+        self._call(op='shutdown')
+
+    def close(self):
+        """Close the connection; the broker reclaims any pending lease."""
+        self._closed.set()
+        self._file.close()
+        self._sock.close()
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def connect(socket_path):
+    """The ``BrokerClient`` for this process and socket path."""
+    key = (os.getpid(), socket_path)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = BrokerClient(socket_path)
+    return client
+
+
+###############################################################################
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Lease test queues, topics, tables and buckets to other processes.')
+    parser.add_argument('-s', '--socket', required=True, help='path of the Unix socket to listen on')
+    parser.add_argument('-r', '--region-name', default=None, help='region name to work on (default is system configuration)')
+    parser.add_argument('--lease-timeout', type=float, default=DEFAULT_LEASE_TIMEOUT, help='seconds without heartbeats before a lease is reclaimed')
+    parser.add_argument('--queues', type=int, default=0, help='number of queues to create up front')
+    parser.add_argument('--topics', type=int, default=0, help='number of topic and queue pairs to create up front')
+    parser.add_argument('--tables', type=int, default=0, help='number of tables (default schema) to create up front')
+    parser.add_argument('--buckets', type=int, default=0, help='number of buckets to create up front')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    args = parse_args()
+    broker = ResourceBroker(args.socket, region_name=args.region_name,
+                            lease_timeout=args.lease_timeout)
+    signal.signal(signal.SIGTERM,
+                  lambda *args: threading.Thread(target=broker.shutdown).start())
+    try:
+        broker.serve_forever(prefill={
+            'queue': args.queues,
+            'topic_queue': args.topics,
+            'table': args.tables,
+            'bucket': args.buckets,
+        })
+    except KeyboardInterrupt:
+        pass
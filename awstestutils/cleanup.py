@@ -1,8 +1,48 @@
 import logging
 import argparse
-import awstestutils
+import re
 
-logging.basicConfig(level=logging.INFO)
+from awstestutils.base import TEST_NAME_PREFIX, _boto3_resource, log
+
+
+def clean_test_queues(prefix=TEST_NAME_PREFIX, region_name=None):
+    """Delete all queues that match a "test" name."""
+    sqs = _boto3_resource('sqs', region_name=region_name)
+    num_queues = 0
+    try:
+        for queue in sqs.queues.all():
+            if re.match(r'.+%s\d+' % TEST_NAME_PREFIX, queue.url):
+                queue.delete()
+                num_queues += 1
+    finally:
+        log.info('deleted %s test queues' % num_queues)
+
+
+def clean_test_topics(prefix=TEST_NAME_PREFIX, region_name=None):
+    """Delete all topics that match a "test" name."""
+    sns = _boto3_resource('sns', region_name=region_name)
+    num_topics = 0
+    try:
+        for topic in sns.topics.all():
+            if re.match(r'.+%s\d+' % TEST_NAME_PREFIX, topic.arn):
+                topic.delete()
+                num_topics += 1
+    finally:
+        log.info('deleted %s test topics' % num_topics)
+
+
+def cleanup(prefix=TEST_NAME_PREFIX, region_name=None):
+    """Delete topics and queues that match a "test" name.
+
+    The documentation for boto3 states: "If you delete a queue, you must wait
+    at least 60 seconds before creating a queue with the same name". This delay
+    applies to this function as well.
+    """
+    log.info('checking for left over test queues')
+    clean_test_queues(prefix, region_name)
+    log.info('checking for left over test queues')
+    clean_test_topics(prefix, region_name)
+    log.info('cleanup done')
 
 
 def parse_args():
@@ -12,7 +52,8 @@ def parse_args():
 
 
 if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
     args = parse_args()
     if args.region_name is not None:
         logging.getLogger('cleanup').info('using region "{}"'.format(args.region_name))
-    awstestutils.cleanup(region_name=args.region_name)
+    cleanup(region_name=args.region_name)
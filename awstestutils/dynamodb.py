@@ -0,0 +1,544 @@
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from awstestutils.base import (LiveTestBoto3Resource, _boto3_client,
+                               _boto3_resource, _broker_client, log)
+
+# Default of create_table() arguments taken from the constructor.
+_FROM_CONSTRUCTOR = object()
+
+
+class StreamCapture:
+    """Read the change records of a DynamoDB stream.
+
+    Every shard is read from a thread pool, a child shard once its parent has
+    been read to the end, and new shards are picked up as the stream splits.
+    Each task reads one batch of a shard and queues the next one, so any
+    number of shards share the ``max_workers`` threads.
+    Records are handed over through a bounded buffer, so readers wait while
+    the consumer is behind.
+
+    Intended usage:
+
+        >>> with live.capture_stream() as capture:
+        >>>     live.table.put_item(Item={'string_key': 'key1', 'numeric_key': 0})
+        >>>     records = capture.wait_for(count=1)
+        >>> print(records[0]['eventName'])
+
+    Records are the dicts returned by ``GetRecords``.
+    """
+
+    def __init__(self, stream_arn, region_name=None,
+                 iterator_type='TRIM_HORIZON', max_workers=32,
+                 buffer_size=1000, poll_interval=0.25, discover_interval=1):
+        """
+        :param stream_arn: ARN of the table's stream
+        :param region_name:
+        :param iterator_type: Where to start reading the shards found on start, ``TRIM_HORIZON`` or ``LATEST`` (closed shards are skipped); shards found later are read from their start
+        :param max_workers: Number of threads reading the shards
+        :param buffer_size: Maximum number of records waiting for the consumer
+        :param poll_interval: Minimum seconds between reads of an open shard with no new records
+        :param discover_interval: Seconds between looking for new shards
+        """
+        self.stream_arn = stream_arn
+        self.iterator_type = iterator_type
+        self.max_workers = max_workers
+        self.poll_interval = poll_interval
+        self.discover_interval = discover_interval
+        self.streams = _boto3_client('dynamodbstreams', region_name=region_name)
+        self.buffer = queue.Queue(maxsize=buffer_size)
+        self.error = None
+        self._stopped = threading.Event()
+        self._changed = threading.Event()
+        self._lock = threading.Lock()
+        self._initial = None
+        self._started = set()
+        self._finished = set()
+        self._executor = None
+        self._discoverer = None
+
+    def _shards(self):
+        shards = []
+        kwargs = {'StreamArn': self.stream_arn}
+        while True:
+            description = self.streams.describe_stream(**kwargs)['StreamDescription']
+            shards.extend(description['Shards'])
+            if 'LastEvaluatedShardId' not in description:
+                return shards
+            kwargs['ExclusiveStartShardId'] = description['LastEvaluatedShardId']
+
+    def _put(self, record):
+        while not self._stopped.is_set():
+            try:
+                self.buffer.put(record, timeout=self.poll_interval)
+                return
+            except queue.Full:
+                pass
+
+    def _fail(self, e):
+        self.error = e
+        self._stopped.set()
+
+    def _submit(self, *args):
+        try:
+            return self._executor.submit(*args)
+        except RuntimeError:
+            # The executor is shut down, the capture was stopped.
+            if not self._stopped.is_set():
+                raise
+
+    def _finish(self, shard_id):
+        with self._lock:
+            self._finished.add(shard_id)
+        self._changed.set()
+
+    def _read_shard(self, shard_id, iterator_type):
+        try:
+            iterator = self.streams.get_shard_iterator(
+                StreamArn=self.stream_arn, ShardId=shard_id,
+                ShardIteratorType=iterator_type)['ShardIterator']
+        except Exception as e:
+            log.warning('could not read shard %s: %s' % (shard_id, e))
+            self._fail(e)
+            return
+        self._submit(self._read_records, shard_id, iterator, 0)
+
+    def _read_records(self, shard_id, iterator, polled_at):
+        """Read one batch of records, then give the worker back.
+
+        The next batch is read by a new task, so every shard gets a turn even
+        when there are more open shards than workers.
+        """
+        if self._stopped.is_set():
+            return
+        try:
+            response = self.streams.get_records(ShardIterator=iterator)
+        except Exception as e:
+            log.warning('could not read shard %s: %s' % (shard_id, e))
+            self._fail(e)
+            return
+        for record in response['Records']:
+            self._put(record)
+        iterator = response.get('NextShardIterator')
+        if iterator is None:
+            self._finish(shard_id)
+            return
+        if not response['Records']:
+            # Wait out what is left of the poll interval for this shard.
+            self._stopped.wait(
+                max(polled_at + self.poll_interval - time.monotonic(), 0))
+        self._submit(self._read_records, shard_id, iterator, time.monotonic())
+
+    def _scan(self):
+        """Start reading the shards that are ready, returns their futures.
+
+        The shards found on the first scan start at ``iterator_type``; with
+        ``LATEST`` the closed ones hold no new records and are skipped, and
+        the open ones start right away. Any other shard starts once its
+        parent has been read, from its start (``TRIM_HORIZON``) or its first
+        records would be lost.
+        """
+        shards = self._shards()
+        if self._initial is None:
+            self._initial = {shard['ShardId'] for shard in shards}
+        known = {shard['ShardId'] for shard in shards}
+        futures = []
+        with self._lock:
+            for shard in shards:
+                shard_id = shard['ShardId']
+                if shard_id in self._started:
+                    continue
+                if shard_id in self._initial and self.iterator_type == 'LATEST':
+                    self._started.add(shard_id)
+                    if 'EndingSequenceNumber' in shard.get('SequenceNumberRange', {}):
+                        self._finished.add(shard_id)
+                    else:
+                        futures.append(self._submit(self._read_shard, shard_id,
+                                                    self.iterator_type))
+                    continue
+                parent = shard.get('ParentShardId')
+                if parent is None or parent not in known or parent in self._finished:
+                    self._started.add(shard_id)
+                    iterator_type = (self.iterator_type if shard_id in self._initial
+                                     else 'TRIM_HORIZON')
+                    futures.append(self._submit(self._read_shard, shard_id,
+                                                iterator_type))
+        return [future for future in futures if future is not None]
+
+    def _discover(self):
+        """Scan for new shards until the capture is stopped."""
+        while not self._stopped.is_set():
+            self._changed.wait(self.discover_interval)
+            self._changed.clear()
+            if self._stopped.is_set():
+                return
+            try:
+                self._scan()
+            except Exception as e:
+                log.warning('could not describe stream: %s' % e)
+                self._fail(e)
+                return
+
+    def start(self):
+        """Start reading the stream in the background.
+
+        Returns once the shards found on start have their iterators, so the
+        changes made afterwards are captured, even with ``LATEST``.
+        """
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            wait(self._scan())
+        except Exception as e:
+            log.warning('could not describe stream: %s' % e)
+            self._fail(e)
+        self._discoverer = threading.Thread(target=self._discover, daemon=True)
+        self._discoverer.start()
+
+    def stop(self):
+        """Stop reading; records already buffered can still be consumed."""
+        self._stopped.set()
+        self._changed.set()
+        if self._discoverer is not None:
+            self._discoverer.join()
+            self._executor.shutdown(wait=True)
+
+    def records(self, timeout=None):
+        """Yield change records as they are read.
+
+        The generator ends after ``timeout`` seconds without records, or once
+        the capture is stopped and the buffer is empty. An error reading the
+        stream is raised here.
+        """
+        last_record = time.monotonic()
+        while True:
+            try:
+                record = self.buffer.get(timeout=self.poll_interval)
+            except queue.Empty:
+                if self.error is not None:
+                    raise RuntimeError('DynamoDB could not read stream: %s' % self.error)
+                if self._stopped.is_set():
+                    return
+                if timeout is not None and time.monotonic() - last_record >= timeout:
+                    return
+                continue
+            last_record = time.monotonic()
+            yield record
+
+    def wait_for(self, count=None, predicate=None, timeout=30):
+        """Consume records until ``count`` have been seen, or one matches.
+
+        Returns the records seen. Raises ``TimeoutError`` if neither happens
+        within ``timeout`` seconds.
+        """
+        seen = []
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                record = self.buffer.get(timeout=min(remaining, self.poll_interval))
+            except queue.Empty:
+                if self.error is not None or self._stopped.is_set():
+                    break
+                continue
+            seen.append(record)
+            if count is not None and len(seen) >= count:
+                return seen
+            if predicate is not None and predicate(record):
+                return seen
+        if self.error is not None:
+            raise RuntimeError('DynamoDB could not read stream: %s' % self.error)
+        raise TimeoutError('saw %s records in %s seconds' % (len(seen), timeout))
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+class LiveTestDynamoDBTable(LiveTestBoto3Resource):
+    """
+    Context manage the test DynamoDB Table.
+
+    Intended usage to handle setup and tear down queue:
+
+        >>> live = LiveTestDynamoDBTable()
+        >>> live.create_table()
+        >>> live.table.put_item(Item={
+        >>>     'string_key': 'key1',
+        >>>     'numeric_key': 0,
+        >>>     'attribute_1': 'attribute'
+        >>> })
+        >>> response = live.table.get_item(Key={
+        >>>     'string_key': 'key1',
+        >>>     'numeric_key': 0
+        >>> })
+        >>> print(response['Item'])
+        >>> live.destroy_table()
+
+    Intended usage as a context manager:
+
+        >>> with LiveTestDynamoDBTable() as table:
+        >>>     table.put_item(Item={
+        >>>         'string_key': 'key1',
+        >>>         'numeric_key': 0,
+        >>>         'attribute_1': 'attribute'
+        >>>     })
+        >>>     response = table.get_item(Key={
+        >>>         'string_key': 'key1',
+        >>>         'numeric_key': 0
+        >>>     })
+        >>>     print(response['Item'])
+
+    To capture the table's changes, enable its stream and read it:
+
+        >>> live = LiveTestDynamoDBTable(stream_view_type='NEW_AND_OLD_IMAGES')
+        >>> live.create_table()
+        >>> with live.capture_stream() as capture:
+        >>>     live.table.put_item(Item={'string_key': 'key1', 'numeric_key': 0})
+        >>>     records = capture.wait_for(count=1)
+        >>> live.destroy_table()
+
+    To customize the schema as a context manager you simply need to:
+
+        >>> key_schema, attributes_definitions, provisioned_throughput = LiveTestDynamoDBTable.create_key_schema(
+        >>>                                                                      partition_key_name='my_partition_key',
+        >>>                                                                      sorting_key_name='my_sorting_key',
+        >>>                                                                      partition_key_type='S',
+        >>>                                                                      sorting_key_type='N',
+        >>>                                                                      read_capacity_units=1,
+        >>>                                                                      write_capacity_units=1)
+        >>> with LiveTestDynamoDBTable(key_schema_definition=key_schema,
+        >>>                            attribute_definitions=attributes_definitions,
+        >>>                            provisioned_throughput=provisioned_throughput) as table:
+        >>>     table.put_item(Item={
+        >>>         'my_partition_key': 'key1',
+        >>>         'my_sorting_key': 0,
+        >>>         'attribute_1': 'attribute'
+        >>>     })
+        >>>     response = table.get_item(Key={
+        >>>         'my_partition_key': 'key1',
+        >>>         'my_sorting_key': 0
+        >>>     })
+        >>>     print(response['Item'])
+
+    When a resource broker is in use (see ``awstestutils.broker``) the table
+    is leased from the broker instead, and given back on exit.
+    """
+    __DEFAULT_KEY_SCHEMA = [
+        {
+            'AttributeName': 'string_key',
+            'KeyType': 'HASH'
+        },
+        {
+            'AttributeName': 'numeric_key',
+            'KeyType': 'RANGE'
+        }
+    ]
+
+    __DEFAULT_ATTRIBUTE_DEFINITIONS = [
+        {
+            'AttributeName': 'string_key',
+            'AttributeType': 'S'
+        },
+        {
+            'AttributeName': 'numeric_key',
+            'AttributeType': 'N'
+        }
+    ]
+
+    __DEFAULT_PROVISIONED_THROUGHPUT = {
+        'ReadCapacityUnits': 1,
+        'WriteCapacityUnits': 1
+    }
+
+    @staticmethod
+    def create_key_schema(partition_key_name='string-key', sorting_key_name='numeric_key',
+                          partition_key_type='S', sorting_key_type='N',
+                          read_capacity_units=1, write_capacity_units=1):
+        """
+        Helper function to make the table's schema painlessly.
+
+        :param partition_key_name: Name for the table's partition key
+        :param sorting_key_name: Name for the table's sorting key
+        :param partition_key_type: Type for the table's partition key (String, Numeric, Set, etc)
+        :param sorting_key_type: Type for the tables's sorting key (String, Numeric, Set, etc)
+        :param read_capacity_units: Quantity of read capacity units
+        :param write_capacity_units: Quantity of write capacity units
+        :return: tuple with key_schema, attribute_definitions and provisioned_throughput
+        """
+        key_schema = []
+        attributes_definitions = []
+
+        def append_key(key_name, key_type, attribute_type):
+            key_schema.append({
+                'AttributeName': key_name,
+                'KeyType': key_type
+            })
+            attributes_definitions.append({
+                'AttributeName': key_name,
+                'AttributeType': attribute_type
+            })
+
+        if partition_key_name:
+            append_key(partition_key_name, 'HASH', partition_key_type)
+        if sorting_key_name:
+            append_key(sorting_key_name, 'RANGE', sorting_key_type)
+
+        return key_schema, attributes_definitions, {
+            'ReadCapacityUnits': read_capacity_units,
+            'WriteCapacityUnits': write_capacity_units
+        }
+
+    def __init__(self, region_name=None,
+                 key_schema_definition=__DEFAULT_KEY_SCHEMA,
+                 attribute_definitions=__DEFAULT_ATTRIBUTE_DEFINITIONS,
+                 provisioned_throughput=__DEFAULT_PROVISIONED_THROUGHPUT,
+                 broker=None, stream_view_type=None):
+        """
+        Setup test manager.
+
+        Assumes boto3 correctly configured
+        :param region_name:
+        :param key_schema_definition:
+        :param attribute_definitions:
+        :param provisioned_throughput
+        :param broker: Socket path of the resource broker (False to never lease)
+        :param stream_view_type: Enable the table's stream with this view type (eg: NEW_AND_OLD_IMAGES)
+        """
+        self.table = None
+        self.table_name = None
+        self.region_name = region_name
+        self.lease = None
+        self.broker = _broker_client(broker)
+        self.dynamodb = _boto3_resource('dynamodb', region_name=region_name)
+        self.key_schema_definition = key_schema_definition
+        self.attribute_definitions = attribute_definitions
+        self.provisioned_throughput = provisioned_throughput
+        self.stream_view_type = stream_view_type
+
+    def exists(self, table_name):
+        for table in self.dynamodb.tables.all():
+            if table_name in table.name:
+                return True
+        return False
+
+    def create_table(self,
+                     key_schema_definition=__DEFAULT_KEY_SCHEMA,
+                     attribute_definitions=__DEFAULT_ATTRIBUTE_DEFINITIONS,
+                     provisioned_throughput=__DEFAULT_PROVISIONED_THROUGHPUT,
+                     stream_view_type=_FROM_CONSTRUCTOR):
+        """
+        Creates the testing table with a name.
+        :param key_schema_definition: Table's key schema definition. By default uses:
+        >>> [
+        >>>     {
+        >>>         'AttributeName': 'string_key',
+        >>>         'KeyType': 'HASH'
+        >>>     },
+        >>>     {
+        >>>         'AttributeName': 'numeric_key',
+        >>>         'KeyType': 'RANGE'
+        >>>     }
+        >>> ]
+        :param attribute_definitions: The types for the table's key schema definition. By default uses:
+        >>> [
+        >>>     {
+        >>>         'AttributeName': 'string_key',
+        >>>         'AttributeType': 'S'
+        >>>     },
+        >>>     {
+        >>>         'AttributeName': 'numeric_key',
+        >>>         'AttributeType': 'N'
+        >>>     }
+        >>> ]
+        :param provisioned_throughput: The table's provisioned throughput configuration. By default uses:
+        >>> {
+        >>>     'ReadCapacityUnits': 1,
+        >>>     'WriteCapacityUnits': 1
+        >>> }
+        :param stream_view_type: If not None, the table's stream is enabled with this view type. By default uses the one given to the constructor
+        :return: Nothing
+        """
+        if stream_view_type is _FROM_CONSTRUCTOR:
+            stream_view_type = self.stream_view_type
+        if self.broker is not None:
+            self.lease, resource = self.broker.lease(
+                'table', region_name=self.region_name,
+                key_schema_definition=key_schema_definition,
+                attribute_definitions=attribute_definitions,
+                provisioned_throughput=provisioned_throughput,
+                stream_view_type=stream_view_type)
+            self.table_name = resource['table_name']
+            self.table = self.dynamodb.Table(self.table_name)
+            return
+        table_name = self.generate_name()
+        stream = {}
+        if stream_view_type is not None:
+            stream['StreamSpecification'] = {
+                'StreamEnabled': True,
+                'StreamViewType': stream_view_type,
+            }
+        try:
+            table = self.dynamodb.create_table(
+                TableName=table_name,
+                KeySchema=key_schema_definition,
+                AttributeDefinitions=attribute_definitions,
+                ProvisionedThroughput=provisioned_throughput,
+                **stream)
+        except Exception as e:
+            raise RuntimeError('DynamoDB could not create table: %s' % e)
+        while table.table_status == 'CREATING':
+            time.sleep(0.01)
+            table = self.dynamodb.Table(table_name)
+        self.table_name, self.table = table_name, table
+
+    def capture_stream(self, **kwargs):
+        """A ``StreamCapture`` of the table's stream, not started yet.
+
+        The table must have been created with a ``stream_view_type``. Keyword
+        arguments are passed on to ``StreamCapture``. Use
+        ``iterator_type='LATEST'`` on tables leased from the broker, whose
+        stream holds the changes of previous leases.
+        """
+        stream_arn = self.table.latest_stream_arn
+        if stream_arn is None:
+            raise ValueError('the table has no stream')
+        return StreamCapture(stream_arn, region_name=self.region_name, **kwargs)
+
+    def destroy_table(self):
+        """Destroys the created table."""
+        if self.table is None or self.table_name is None:
+            raise ValueError('inner table or table name are none')
+        if self.lease is not None:
+            self.broker.release(self.lease)
+            self.lease = None
+            self.table, self.table_name = None, None
+            return
+        while self.table.table_status == 'CREATING' or self.table.table_status == 'UPDATING':
+            time.sleep(0.01)
+            self.table = self.dynamodb.Table(self.table_name)
+        if self.table.table_status == 'ACTIVE':
+            response = self.table.delete()
+            if self._is_error_call(response):
+                raise RuntimeError('DynamoDB coul not delete the table: %s' % response)
+            self.table, self.table_name = None, None
+        elif self.table.table_status == 'DELETED':
+            pass
+        else:
+            raise ValueError('Unknown table state')
+
+    def __enter__(self):
+        self.create_table(key_schema_definition=self.key_schema_definition,
+                          attribute_definitions=self.attribute_definitions,
+                          provisioned_throughput=self.provisioned_throughput,
+                          stream_view_type=self.stream_view_type)
+        return self.table
+
+    def __exit__(self, *args):
+        self.destroy_table()
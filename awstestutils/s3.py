@@ -0,0 +1,283 @@
+import mmap
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from awstestutils.base import (LiveTestBoto3Resource, _boto3_resource,
+                               _broker_client)
+
+MAX_WORKERS = 16
+MULTIPART_THRESHOLD = 8 * 1024 * 1024
+PART_SIZE = 8 * 1024 * 1024
+MIN_PART_SIZE = 5 * 1024 * 1024
+DELETE_BATCH_SIZE = 1000
+
+
+def _run_concurrently(tasks, max_workers):
+    """Run the callables from ``tasks`` in a thread pool.
+
+    Only a bounded number of tasks are submitted at a time, so ``tasks`` can
+    be a generator over more objects than fit in memory. The first error is
+    raised once the running tasks are done.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        running = set()
+        for task in tasks:
+            if len(running) >= max_workers * 2:
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    future.result()
+            running.add(executor.submit(task))
+        for future in wait(running).done:
+            future.result()
+
+
+class _MultipartUpload:
+    """A local file uploaded in parts, straight from a memory map.
+
+    Each part is its own task; the task finishing the last part completes the
+    upload.
+    """
+
+    def __init__(self, client, bucket_name, key, path, part_size):
+        self.client = client
+        self.bucket_name = bucket_name
+        self.key = key
+        self.part_size = part_size
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.num_parts = -(-len(self.map) // part_size)
+        self.parts = [None] * self.num_parts
+        self.lock = threading.Lock()
+        self.failed = False
+        self.upload_id = client.create_multipart_upload(
+            Bucket=bucket_name, Key=key)['UploadId']
+
+    def tasks(self):
+        for number in range(1, self.num_parts + 1):
+            yield lambda number=number: self._upload_part(number)
+
+    def _upload_part(self, number):
+        start = (number - 1) * self.part_size
+        try:
+            response = self.client.upload_part(
+                Bucket=self.bucket_name, Key=self.key,
+                UploadId=self.upload_id, PartNumber=number,
+                Body=self.map[start:start + self.part_size])
+        except Exception:
+            self._abort()
+            raise
+        with self.lock:
+            self.parts[number - 1] = {'PartNumber': number,
+                                      'ETag': response['ETag']}
+            if self.failed or not all(self.parts):
+                return
+        self.map.close()
+        try:
+            self.client.complete_multipart_upload(
+                Bucket=self.bucket_name, Key=self.key,
+                UploadId=self.upload_id, MultipartUpload={'Parts': self.parts})
+        except Exception:
+            self._abort()
+            raise
+
+    def _abort(self):
+        with self.lock:
+            if self.failed:
+                return
+            self.failed = True
+        self.map.close()
+        self.client.abort_multipart_upload(
+            Bucket=self.bucket_name, Key=self.key, UploadId=self.upload_id)
+
+
+class LiveTestS3Bucket(LiveTestBoto3Resource):
+    """
+    Context manage the test S3 bucket.
+
+    Intended usage to handle setup and tear down bucket:
+
+        >>> live = LiveTestS3Bucket()
+        >>> live.create_bucket()
+        >>> live.seed((str(i), b'data') for i in range(10000))
+        >>> live.seed_files([('big', '/tmp/big.bin')])
+        >>> print(len(list(live.bucket.objects.all())))
+        >>> live.destroy_bucket()
+
+    Intended usage as a context manager:
+
+        >>> with LiveTestS3Bucket() as bucket:
+        >>>     bucket.put_object(Key='some', Body=b'data')
+        >>>     print(bucket.Object('some').get()['Body'].read())
+
+    Seeding uploads the objects from a thread pool, and local files larger
+    than ``MULTIPART_THRESHOLD`` are uploaded in parts from a memory map.
+    Emptying lists every object version, then deletes them 1000 keys per call
+    from a thread pool; the bucket is emptied before it is destroyed.
+
+    When a resource broker is in use (see ``awstestutils.broker``) the bucket
+    is leased from the broker instead, and given back on exit.
+    """
+
+    # Bucket names are shared with every account, use a wider random range.
+    L_NAME = 100000000000
+    U_NAME = 1000000000000
+
+    def __init__(self, region_name=None, versioning=False, broker=None):
+        """Setup test manager.
+
+        Assumes boto3 correctly configured.
+        :param region_name:
+        :param versioning: Whether to enable versioning on the bucket
+        :param broker: Socket path of the resource broker (False to never lease)
+        """
+        self.bucket = None
+        self.bucket_name = None
+        self.region_name = region_name
+        self.versioning = versioning
+        self.lease = None
+        self.broker = _broker_client(broker)
+        self.s3 = _boto3_resource('s3', region_name=region_name)
+
+    def exists(self, bucket_name):
+        # Bucket names are global, so check the name and not only our buckets.
+        from botocore.exceptions import ClientError
+        try:
+            self.s3.meta.client.head_bucket(Bucket=bucket_name)
+        except ClientError as e:
+            code = e.response['Error']['Code']
+            if code in ('404', 'NoSuchBucket'):
+                return False
+            # Owned by another account (403) or in another region (301).
+            if code in ('403', 'AccessDenied', '301', 'PermanentRedirect'):
+                return True
+            raise
+        return True
+
+    def create_bucket(self):
+        """Creates a bucket name and the s3.Bucket."""
+        if self.broker is not None:
+            self.lease, resource = self.broker.lease(
+                'bucket', region_name=self.region_name,
+                versioning=self.versioning)
+            self.bucket_name = resource['bucket_name']
+            self.bucket = self.s3.Bucket(self.bucket_name)
+            return
+        bucket_name = self.generate_name()
+        region_name = self.s3.meta.client.meta.region_name
+        configuration = {}
+        if region_name != 'us-east-1':
+            configuration['CreateBucketConfiguration'] = {
+                'LocationConstraint': region_name}
+        try:
+            bucket = self.s3.create_bucket(Bucket=bucket_name, **configuration)
+            bucket.wait_until_exists()
+            if self.versioning:
+                bucket.Versioning().enable()
+        except Exception as e:
+            raise RuntimeError('S3 could not create bucket: %s' % e)
+        self.bucket_name, self.bucket = bucket_name, bucket
+
+    def seed(self, objects, max_workers=MAX_WORKERS):
+        """Upload ``(key, data)`` pairs concurrently.
+
+        ``objects`` can be a generator; only a few objects are held in memory
+        at a time.
+        """
+        client = self.s3.meta.client
+
+        def tasks():
+            for key, data in objects:
+                yield lambda key=key, data=data: client.put_object(
+                    Bucket=self.bucket_name, Key=key, Body=data)
+
+        _run_concurrently(tasks(), max_workers)
+
+    def _put_file(self, key, path):
+        with open(path, 'rb') as f:
+            self.s3.meta.client.put_object(Bucket=self.bucket_name, Key=key,
+                                           Body=f)
+
+    def seed_files(self, files, max_workers=MAX_WORKERS,
+                   multipart_threshold=MULTIPART_THRESHOLD,
+                   part_size=PART_SIZE):
+        """Upload ``(key, path)`` pairs of local files concurrently.
+
+        Files of ``multipart_threshold`` bytes or more are uploaded in parts
+        of ``part_size`` bytes (5 MiB at least), read from a memory map.
+        """
+        if part_size < MIN_PART_SIZE:
+            raise ValueError('S3 parts are 5 MiB at least, got %s bytes'
+                             % part_size)
+        client = self.s3.meta.client
+
+        def tasks():
+            for key, path in files:
+                if os.path.getsize(path) < multipart_threshold:
+                    yield lambda key=key, path=path: self._put_file(key, path)
+                else:
+                    upload = _MultipartUpload(client, self.bucket_name, key,
+                                              path, part_size)
+                    yield from upload.tasks()
+
+        _run_concurrently(tasks(), max_workers)
+
+    def _delete_objects(self, objects):
+        response = self.s3.meta.client.delete_objects(
+            Bucket=self.bucket_name,
+            Delete={'Objects': objects, 'Quiet': True})
+        if response.get('Errors'):
+            raise RuntimeError('S3 could not delete objects: %s'
+                               % response['Errors'][:10])
+
+    def _delete_batches(self):
+        """Batches of every object version and delete marker in the bucket."""
+        paginator = self.s3.meta.client.get_paginator('list_object_versions')
+        batch = []
+        for page in paginator.paginate(Bucket=self.bucket_name):
+            for version in page.get('Versions', []) + page.get('DeleteMarkers', []):
+                batch.append({'Key': version['Key'],
+                              'VersionId': version['VersionId']})
+                if len(batch) == DELETE_BATCH_SIZE:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
+
+    def empty(self, max_workers=MAX_WORKERS):
+        """Delete every object, version and pending multipart upload."""
+        client = self.s3.meta.client
+        paginator = client.get_paginator('list_multipart_uploads')
+        for page in paginator.paginate(Bucket=self.bucket_name):
+            for upload in page.get('Uploads', []):
+                client.abort_multipart_upload(Bucket=self.bucket_name,
+                                              Key=upload['Key'],
+                                              UploadId=upload['UploadId'])
+        # List everything before deleting, so the listing does not change
+        # under the paginator.
+        batches = list(self._delete_batches())
+        _run_concurrently(
+            (lambda batch=batch: self._delete_objects(batch)
+             for batch in batches),
+            max_workers)
+
+    def destroy_bucket(self):
+        """Empty and destroy the bucket."""
+        if self.lease is not None:
+            self.broker.release(self.lease)
+            self.lease = None
+            self.bucket, self.bucket_name = None, None
+            return
+        self.empty()
+        response = self.bucket.delete()
+        status = response.get('ResponseMetadata', {}).get('HTTPStatusCode')
+        if status not in (200, 204):
+            raise RuntimeError('S3 could not delete bucket: %s' % response)
+        self.bucket, self.bucket_name = None, None
+
+    def __enter__(self):
+        self.create_bucket()
+        return self.bucket
+
+    def __exit__(self, *args):
+        self.destroy_bucket()
@@ -0,0 +1,356 @@
+import json
+import math
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from awstestutils.base import (LiveTestBoto3Resource, _boto3_resource,
+                               _broker_client)
+from awstestutils.sqs import LiveTestQueue
+
+# Upper bounds, in milliseconds, of the latency histogram buckets.
+HISTOGRAM_BOUNDS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class DeliveryReport:
+    """The outcome of a ``DeliveryProbe`` run.
+
+    Latencies are in milliseconds, from just before publishing to the topic
+    until the message is received from the queue.
+    """
+
+    def __init__(self, sent, latencies, lost, duplicates):
+        self.sent = sent
+        self.latencies = sorted(latencies)
+        self.lost = lost
+        self.duplicates = duplicates
+
+    @property
+    def received(self):
+        return len(self.latencies)
+
+    def percentile(self, percent):
+        """Nearest-rank percentile of the latencies, None if none received."""
+        if not self.latencies:
+            return None
+        rank = max(math.ceil(percent / 100 * len(self.latencies)), 1)
+        return self.latencies[rank - 1]
+
+    def histogram(self, bounds=HISTOGRAM_BOUNDS):
+        """Count of latencies per bucket, keyed by the bucket upper bound.
+
+        Latencies above the last bound are counted under ``'inf'``.
+        """
+        counts = dict.fromkeys([str(bound) for bound in bounds] + ['inf'], 0)
+        for latency in self.latencies:
+            for bound in bounds:
+                if latency <= bound:
+                    counts[str(bound)] += 1
+                    break
+            else:
+                counts['inf'] += 1
+        return counts
+
+    def to_dict(self):
+        return {
+            'sent': self.sent,
+            'received': self.received,
+            'lost': self.lost,
+            'duplicates': self.duplicates,
+            'latency_ms': {
+                'min': self.latencies[0] if self.latencies else None,
+                'p50': self.percentile(50),
+                'p90': self.percentile(90),
+                'p99': self.percentile(99),
+                'max': self.latencies[-1] if self.latencies else None,
+            },
+            'histogram_ms': self.histogram(),
+        }
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.to_dict(), **kwargs)
+
+
+class DeliveryProbe:
+    """Measure the topic to queue delivery latency.
+
+    Publishes ``count`` sequence-numbered, timestamped messages at ``rate``
+    messages per second while receivers long poll the queue, then reports the
+    latencies, the messages lost and the duplicates delivered.
+
+    Intended usage:
+
+        >>> live = LiveTestTopicQueue()
+        >>> live.create_topic_and_queue()
+        >>> report = DeliveryProbe(live, rate=50, count=500).run()
+        >>> print(report.to_json())
+        >>> live.destroy_topic_and_queue()
+    """
+
+    def __init__(self, live, rate=10, count=100, publishers=4, receivers=4,
+                 wait_time_seconds=2, timeout=30):
+        """
+        :param live: The ``LiveTestTopicQueue``, with its topic and queue created
+        :param rate: Messages published per second
+        :param count: Number of messages to publish
+        :param publishers: Number of threads publishing
+        :param receivers: Number of threads receiving
+        :param wait_time_seconds: Long polling wait of each receive call
+        :param timeout: Seconds to wait for deliveries after the last publish
+        """
+        if rate <= 0:
+            raise ValueError('rate must be positive, got %s' % rate)
+        self.live = live
+        self.rate = rate
+        self.count = count
+        self.publishers = publishers
+        self.receivers = receivers
+        self.wait_time_seconds = wait_time_seconds
+        self.timeout = timeout
+        self.probe_id = uuid.uuid4().hex
+        self._lock = threading.Lock()
+        self._deliveries = Counter()
+        self._latencies = []
+        self._all_received = threading.Event()
+        self._stopped = threading.Event()
+        self._error = None
+
+    def _publish(self, seq):
+        self.live.sns.meta.client.publish(
+            TopicArn=self.live.topic.arn,
+            Message=json.dumps({'probe': self.probe_id, 'seq': seq,
+                                'sent': time.time()}))
+
+    def _record(self, msg, received):
+        # Skip anything that is not one of this probe's messages: raw
+        # deliveries, other notifications, stray messages on a reused queue.
+        try:
+            payload = json.loads(msg.message)
+            if payload['probe'] != self.probe_id:
+                return
+            seq, latency = payload['seq'], (received - payload['sent']) * 1000
+        except (ValueError, KeyError, TypeError):
+            return
+        with self._lock:
+            self._deliveries[seq] += 1
+            if self._deliveries[seq] == 1:
+                self._latencies.append(latency)
+                if len(self._latencies) == self.count:
+                    self._all_received.set()
+
+    def _receive(self):
+        try:
+            while not self._stopped.is_set():
+                msgs = self.live.receive(wait_time_seconds=self.wait_time_seconds)
+                received = time.time()
+                if not msgs:
+                    continue
+                self.live.acknowledge(msgs)
+                for msg in msgs:
+                    self._record(msg, received)
+        except Exception as e:
+            self._error = e
+            self._all_received.set()
+
+    def run(self):
+        """Publish, wait for the deliveries and return a ``DeliveryReport``."""
+        receivers = [threading.Thread(target=self._receive, daemon=True)
+                     for _ in range(self.receivers)]
+        for receiver in receivers:
+            receiver.start()
+        try:
+            with ThreadPoolExecutor(max_workers=self.publishers) as executor:
+                start = time.monotonic()
+                published = []
+                for seq in range(self.count):
+                    delay = start + seq / self.rate - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                    published.append(executor.submit(self._publish, seq))
+                for future in published:
+                    future.result()
+            self._all_received.wait(self.timeout)
+        finally:
+            self._stopped.set()
+            for receiver in receivers:
+                receiver.join()
+        if self._error is not None:
+            raise RuntimeError('SQS could not receive probe messages: %s' % self._error)
+        with self._lock:
+            duplicates = sum(n - 1 for n in self._deliveries.values())
+            return DeliveryReport(self.count, self._latencies,
+                                  self.count - len(self._deliveries),
+                                  duplicates)
+
+
+class LiveTestTopicQueue(LiveTestBoto3Resource):
+    """Context manage the test SNS topics. Uses a SQS queue to receive the
+    published messages.
+
+    Intended usage to handle setup and tear down topic:
+
+        >>> live = LiveTestTopicQueue(backend.queue)
+        >>> live.create_topic_and_queue()
+        >>>
+        >>> live.topic.publish(Message='some')
+        >>>
+        >>> msgs = live.queue.receive_messages()
+        >>> print(msgs[0].body)
+        >>>
+        >>> live.destroy_topic_and_queue()
+
+    Intended usage as a context manager:
+
+        >>> with LiveTestTopicQueue() as (topic, queue):
+        >>>     topic.publish(Message='some')
+        >>>     msgs = queue.receive_messages()
+        >>>     print(msgs[0].body)
+
+    To measure how long deliveries take, instead of guessing sleeps:
+
+        >>> report = live.probe_delivery(rate=50, count=500)
+        >>> print(report.percentile(99), report.lost, report.duplicates)
+
+    When a resource broker is in use (see ``awstestutils.broker``) the topic
+    and queue are leased from the broker as a pair, and given back on exit.
+
+    The lightweight receive path of ``LiveTestQueue`` is available too, the
+    SNS envelope is only decoded when asked for:
+
+        >>> for msg in live.drain():
+        >>>     print(msg.message)
+    """
+
+    def __init__(self, region_name=None, broker=None):
+        """Setup test manager.
+
+        Assumes boto3 correctly configured.
+        """
+        self.topic = None
+        self.topic_name = None
+        self.queue = None
+        self.queue_name = None
+        self.region_name = region_name
+        self.lease = None
+        self.broker = _broker_client(broker)
+        # The pair is leased as a whole, never the queue on its own.
+        self.queue_manager = LiveTestQueue(region_name=region_name, broker=False)
+        self.sns = _boto3_resource('sns', region_name=region_name)
+
+    def create_queue_policy(self, topic, queue):
+        """The queue needs a policy to allow the topic to post to it."""
+        return {
+            'Version': '2012-10-17',
+            'Statement': [
+                {
+                    'Sid': 'TestTopicQueuePolicy',
+                    'Effect': 'Allow',
+                    'Principal': '*',
+                    'Action': 'sqs:SendMessage',
+                    'Resource': queue.attributes['QueueArn'],
+                    'Condition': {
+                        'ArnEquals': {
+                            'aws:SourceArn': topic.arn
+                        }
+                    }
+                }
+            ]
+        }
+
+    def replace_queue_policy(self, topic, queue):
+        policy = self.create_queue_policy(topic, queue)
+        queue.set_attributes(Attributes={
+            'Policy': json.dumps(policy),
+        })
+
+    def exists(self, name):
+        for topic in self.sns.topics.all():
+            if name in topic.arn:
+                return True
+        return False
+
+    def _create_topic(self):
+        """Creates a topic name and the sns.Topic."""
+        topic_name = self.generate_name()
+        try:
+            topic = self.sns.create_topic(Name=topic_name)
+        except Exception as e:
+            raise RuntimeError('SNS could create topic: %s' % e)
+        self.topic_name, self.topic = topic_name, topic
+
+    def _create_queue(self):
+        self.queue_manager.create_queue()
+        self.queue_name = self.queue_manager.queue_name
+        self.queue = self.queue_manager.queue
+
+    def _lease_topic_and_queue(self):
+        self.lease, resource = self.broker.lease(
+            'topic_queue', region_name=self.region_name)
+        self.topic_name = resource['topic_name']
+        self.topic = self.sns.Topic(resource['topic_arn'])
+        self.queue_manager.queue_name = resource['queue_name']
+        self.queue_manager.queue = self.queue_manager.sqs.Queue(resource['queue_url'])
+        self.queue_name = self.queue_manager.queue_name
+        self.queue = self.queue_manager.queue
+
+    def create_topic_and_queue(self):
+        if self.broker is not None:
+            self._lease_topic_and_queue()
+            return
+        self._create_topic()
+        self._create_queue()
+        self.replace_queue_policy(self.topic, self.queue)
+        self.topic.subscribe(
+            Protocol='sqs',
+            Endpoint=self.queue.attributes['QueueArn'])
+
+    def _destroy_topic(self):
+        """Destroy the topic."""
+        response = self.topic.delete()
+        if self._is_error_call(response):
+            raise RuntimeError('SNS could not delete topic: %s' % response)
+        self.topic, self.topic_name = None, None
+
+    def _destroy_queue(self):
+        self.queue_manager.destroy_queue()
+        self.queue, self.queue_name = None, None
+
+    def destroy_topic_and_queue(self):
+        if self.lease is not None:
+            self.broker.release(self.lease)
+            self.lease = None
+            self.queue_manager.queue, self.queue_manager.queue_name = None, None
+            self.queue, self.queue_name = None, None
+            self.topic, self.topic_name = None, None
+            return
+        self._destroy_queue()
+        self._destroy_topic()
+
+    def receive(self, **kwargs):
+        """See ``LiveTestQueue.receive()``."""
+        return self.queue_manager.receive(**kwargs)
+
+    def acknowledge(self, messages):
+        """See ``LiveTestQueue.acknowledge()``."""
+        self.queue_manager.acknowledge(messages)
+
+    def drain(self, acknowledge=True, wait_time_seconds=1, **kwargs):
+        """See ``LiveTestQueue.drain()``."""
+        return self.queue_manager.drain(acknowledge, wait_time_seconds,
+                                        **kwargs)
+
+    def probe_delivery(self, **kwargs):
+        """Run a ``DeliveryProbe`` and return its ``DeliveryReport``.
+
+        Keyword arguments are passed on to ``DeliveryProbe``.
+        """
+        return DeliveryProbe(self, **kwargs).run()
+
+    def __enter__(self):
+        self.create_topic_and_queue()
+        return self.topic, self.queue_manager.queue
+
+    def __exit__(self, *args):
+        self.destroy_topic_and_queue()
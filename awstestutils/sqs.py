@@ -0,0 +1,184 @@
+import json
+
+from awstestutils.base import (LiveTestBoto3Resource, _boto3_resource,
+                               _broker_client)
+
+
+class ReceivedMessage:
+    """A received SQS message, lighter than boto3's ``sqs.Message``.
+
+    Only keeps the body, the receipt handle and the attributes. For messages
+    delivered by SNS, ``notification`` and ``message`` decode the envelope on
+    first access.
+    """
+
+    __slots__ = ('body', 'receipt_handle', 'attributes', 'message_attributes',
+                 '_notification')
+
+    def __init__(self, body, receipt_handle, attributes=None,
+                 message_attributes=None):
+        self.body = body
+        self.receipt_handle = receipt_handle
+        self.attributes = attributes
+        self.message_attributes = message_attributes
+        self._notification = None
+
+    @property
+    def notification(self):
+        """The SNS envelope, as a dict."""
+        if self._notification is None:
+            self._notification = json.loads(self.body)
+        return self._notification
+
+    @property
+    def message(self):
+        """The message published to the SNS topic."""
+        return self.notification['Message']
+
+    def __repr__(self):
+        return 'ReceivedMessage(receipt_handle=%r)' % self.receipt_handle
+
+
+###############################################################################
+
+class LiveTestQueue(LiveTestBoto3Resource):
+    """
+    Context manage the test SQS queue.
+
+    Intended usage to handle setup and tear down queue:
+
+        >>> live = LiveTestQueue()
+        >>> live.create_queue()
+        >>> live.queue.send_message(MessageBody='some')
+        >>> msgs = live.queue.receive_messages()
+        >>> print(msgs[0].body)
+        >>> msg.delete()
+        >>> live.destroy_queue()
+
+    Intended usage as a context manager:
+
+        >>> with LiveTestQueue() as queue:
+        >>>   queue.send_message(MessageBody='some')
+        >>>   msgs = queue.receive_messages()
+        >>>   print(msgs[0].body)
+        >>>   msg.delete()
+
+    When a resource broker is in use (see ``awstestutils.broker``) the queue
+    is leased from the broker instead, and given back on exit.
+
+    To receive many messages cheaply, drain the queue into lightweight
+    ``ReceivedMessage`` records, acknowledged in batches:
+
+        >>> live = LiveTestQueue()
+        >>> live.create_queue()
+        >>> for msg in live.drain():
+        >>>     print(msg.body)
+        >>> live.destroy_queue()
+    """
+
+    def __init__(self, region_name=None, broker=None):
+        """Setup test manager.
+
+        Assumes boto3 correctly configured.
+        """
+        self.queue = None
+        self.queue_name = None
+        self.region_name = region_name
+        self.lease = None
+        self.broker = _broker_client(broker)
+        self.sqs = _boto3_resource('sqs', region_name=region_name)
+
+    def exists(self, queue_name):
+        for queue in self.sqs.queues.all():
+            if queue_name in queue.url:
+                return True
+        return False
+
+    def create_queue(self):
+        """Creates a queue name and the sqs.Queue."""
+        if self.broker is not None:
+            self.lease, resource = self.broker.lease(
+                'queue', region_name=self.region_name)
+            self.queue_name = resource['queue_name']
+            self.queue = self.sqs.Queue(resource['queue_url'])
+            return
+        queue_name = self.generate_name()
+        try:
+            queue = self.sqs.create_queue(QueueName=queue_name)
+        except Exception as e:
+            raise RuntimeError('SQS could create queue: %s' % e)
+        self.queue_name, self.queue = queue_name, queue
+
+    def destroy_queue(self):
+        """Destroy the queue (AWS SQS delays apply)."""
+        if self.lease is not None:
+            self.broker.release(self.lease)
+            self.lease = None
+            self.queue, self.queue_name = None, None
+            return
+        response = self.queue.delete()
+        if self._is_error_call(response):
+            raise RuntimeError('SQS could not delete queue: %s' % response)
+        self.queue, self.queue_name = None, None
+
+    def receive(self, max_number=10, wait_time_seconds=0,
+                attribute_names=(), message_attribute_names=()):
+        """Receive up to ``max_number`` (at most 10) ``ReceivedMessage``.
+
+        Uses the low-level client, so no ``sqs.Message`` is built.
+        """
+        response = self.sqs.meta.client.receive_message(
+            QueueUrl=self.queue.url,
+            MaxNumberOfMessages=max_number,
+            WaitTimeSeconds=wait_time_seconds,
+            AttributeNames=list(attribute_names),
+            MessageAttributeNames=list(message_attribute_names))
+        return [ReceivedMessage(msg['Body'], msg['ReceiptHandle'],
+                                msg.get('Attributes'),
+                                msg.get('MessageAttributes'))
+                for msg in response.get('Messages', ())]
+
+    def acknowledge(self, messages):
+        """Delete the received messages, 10 per call."""
+        client = self.sqs.meta.client
+        for start in range(0, len(messages), 10):
+            response = client.delete_message_batch(
+                QueueUrl=self.queue.url,
+                Entries=[{'Id': str(i), 'ReceiptHandle': msg.receipt_handle}
+                         for i, msg in enumerate(messages[start:start + 10])])
+            if response.get('Failed'):
+                raise RuntimeError('SQS could not delete messages: %s'
+                                   % response['Failed'])
+
+    def drain(self, acknowledge=True, wait_time_seconds=1, **kwargs):
+        """Yield ``ReceivedMessage`` records until the queue looks empty.
+
+        The queue looks empty once a receive comes back with no messages. It
+        long polls (``wait_time_seconds`` at least 1) because a short poll
+        only samples some SQS servers, and can come back empty while messages
+        remain.
+
+        Each received batch is acknowledged once all its messages have been
+        yielded, unless ``acknowledge`` is False. Other keyword arguments are
+        passed on to ``receive()``.
+        """
+        if wait_time_seconds < 1:
+            raise ValueError('drain() needs long polling, wait_time_seconds >= 1')
+        kwargs['wait_time_seconds'] = wait_time_seconds
+        # Not a generator itself, so a bad argument is raised on the call.
+        return self._drain(acknowledge, kwargs)
+
+    def _drain(self, acknowledge, kwargs):
+        msgs = self.receive(**kwargs)
+        while msgs:
+            yield from msgs
+            if acknowledge:
+                self.acknowledge(msgs)
+            msgs = self.receive(**kwargs)
+
+    def __enter__(self):
+        self.create_queue()
+        return self.queue
+
+    def __exit__(self, *args):
+        self.destroy_queue()
@@ -0,0 +1,170 @@
+"""Benchmarks against live AWS resources.
+
+Like the tests, these need the network and boto3 correctly configured. Run one
+with, eg: ``python benchmarks.py receive --messages 10000``. The ``import``
+benchmark runs locally.
+"""
+import argparse
+import subprocess
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import awstestutils
+
+
+def _fill_queue(queue, num_messages):
+    """Send ``num_messages`` small messages, in batches of 10."""
+    def send(start):
+        queue.send_messages(Entries=[
+            {'Id': str(i), 'MessageBody': 'message %d' % (start + i)}
+            for i in range(min(10, num_messages - start))])
+
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        list(executor.map(send, range(0, num_messages, 10)))
+
+
+def _receive_resources(live):
+    """Receive boto3 ``sqs.Message`` objects, acknowledged in batches.
+
+    Long polls like ``drain()``, so both paths stop on the same condition.
+    """
+    received = []
+    msgs = live.queue.receive_messages(MaxNumberOfMessages=10,
+                                       WaitTimeSeconds=1)
+    while msgs:
+        received.extend(msgs)
+        live.queue.delete_messages(Entries=[
+            {'Id': str(i), 'ReceiptHandle': msg.receipt_handle}
+            for i, msg in enumerate(msgs)])
+        msgs = live.queue.receive_messages(MaxNumberOfMessages=10,
+                                           WaitTimeSeconds=1)
+    return received
+
+
+def _receive_records(live):
+    """Receive ``ReceivedMessage`` records, acknowledged in batches.
+
+    ``drain()`` long polls, one second by default.
+    """
+    return list(live.drain())
+
+
+def _run_receive(receive, num_messages, region_name, trace):
+    """Receive ``num_messages`` from a new queue, returns the count, the
+    seconds taken and the peak traced memory (if ``trace``)."""
+    live = awstestutils.LiveTestQueue(region_name=region_name)
+    live.create_queue()
+    try:
+        _fill_queue(live.queue, num_messages)
+        if trace:
+            tracemalloc.start()
+        start = time.perf_counter()
+        received = receive(live)
+        elapsed = time.perf_counter() - start
+        peak = None
+        if trace:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+    finally:
+        live.destroy_queue()
+    return len(received), elapsed, peak
+
+
+def benchmark_receive(num_messages, region_name=None):
+    """Compare memory and throughput of both receive paths.
+
+    Both paths keep every received message, as a test checking the messages
+    would, and acknowledge in batches so only the representation differs.
+    Each path runs twice: timed without tracemalloc, whose per allocation
+    overhead would skew the throughput, then traced for the peak memory.
+    """
+    for label, receive in (('sqs.Message', _receive_resources),
+                           ('ReceivedMessage', _receive_records)):
+        received, elapsed, _ = _run_receive(receive, num_messages,
+                                            region_name, trace=False)
+        traced, _, peak = _run_receive(receive, num_messages, region_name,
+                                       trace=True)
+        print('%-16s %7d msgs  %8.0f msgs/s  peak %8.1f KiB  (%.0f B/msg)' % (
+            label, received, received / elapsed, peak / 1024,
+            peak / max(traced, 1)))
+
+
+def benchmark_import(repeat):
+    """Time importing the package and a fixture in new interpreters.
+
+    Reports the best of ``repeat`` runs, against an empty interpreter and
+    against importing boto3 directly. Needs no network.
+    """
+    statements = (
+        ('python', 'pass'),
+        ('import awstestutils', 'import awstestutils'),
+        ('import fixtures', 'from awstestutils import LiveTestQueue, LiveTestTopicQueue, LiveTestDynamoDBTable'),
+        ('import boto3', 'import boto3'),
+    )
+    for label, statement in statements:
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            subprocess.check_call([sys.executable, '-c', statement])
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        print('%-28s %7.1f ms' % (label, best * 1000))
+
+
+def benchmark_bucket(num_objects, region_name=None):
+    """Time seeding and tearing down a bucket of small objects."""
+    live = awstestutils.LiveTestS3Bucket(region_name=region_name)
+    live.create_bucket()
+    try:
+        start = time.perf_counter()
+        live.seed(('object-%d' % i, b'data') for i in range(num_objects))
+        elapsed = time.perf_counter() - start
+        print('seed      %7d objects  %7.1f s  %8.0f objects/s' % (
+            num_objects, elapsed, num_objects / elapsed))
+    finally:
+        start = time.perf_counter()
+        live.destroy_bucket()
+        elapsed = time.perf_counter() - start
+    print('teardown  %7d objects  %7.1f s  %8.0f objects/s' % (
+        num_objects, elapsed, num_objects / elapsed))
+
+
+def benchmark_delivery(rate, count, region_name=None):
+    """Print the topic to queue delivery latency report, as JSON."""
+    live = awstestutils.LiveTestTopicQueue(region_name=region_name)
+    live.create_topic_and_queue()
+    try:
+        report = live.probe_delivery(rate=rate, count=count)
+    finally:
+        live.destroy_topic_and_queue()
+    print(report.to_json(indent=2))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark awstestutils against live AWS resources.')
+    parser.add_argument('-r', '--region-name', default=None, help='region name to work on (default is system configuration)')
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+    receive = subparsers.add_parser('receive', help='receive path: sqs.Message vs ReceivedMessage')
+    receive.add_argument('--messages', type=int, default=1000, help='number of messages to receive')
+    bucket = subparsers.add_parser('bucket', help='S3 bucket seeding and teardown')
+    bucket.add_argument('--objects', type=int, default=10000, help='number of objects to seed')
+    delivery = subparsers.add_parser('delivery', help='SNS to SQS delivery latency')
+    delivery.add_argument('--rate', type=float, default=10, help='messages published per second')
+    delivery.add_argument('--messages', type=int, default=100, help='number of messages to publish')
+    imports = subparsers.add_parser('import', help='package import time')
+    imports.add_argument('--repeat', type=int, default=10, help='number of runs to take the best of')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    if args.benchmark == 'receive':
+        benchmark_receive(args.messages, region_name=args.region_name)
+    elif args.benchmark == 'bucket':
+        benchmark_bucket(args.objects, region_name=args.region_name)
+    elif args.benchmark == 'delivery':
+        benchmark_delivery(args.rate, args.messages, region_name=args.region_name)
+    elif args.benchmark == 'import':
+        benchmark_import(args.repeat)
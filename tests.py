@@ -1,12 +1,51 @@
 import unittest
 import time
 import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
 
 import boto3
 
 from awstestutils import (LiveTestBoto3Resource,
                           LiveTestQueue,
-                          LiveTestTopicQueue, LiveTestDynamoDBTable)
+                          LiveTestTopicQueue, LiveTestDynamoDBTable,
+                          LiveTestS3Bucket, StreamCapture, DeliveryProbe,
+                          DeliveryReport, ReceivedMessage)
+from awstestutils import broker
+from awstestutils.broker import BrokerClient, ResourceBroker
+
+
+class LazyImportTestCase(unittest.TestCase):
+    def _loaded_after(self, code):
+        """Whether boto3 is loaded after running ``code`` in a new interpreter."""
+        output = subprocess.check_output([
+            sys.executable, '-c',
+            '%s; import sys; print("boto3" in sys.modules)' % code])
+        return output.strip() == b'True'
+
+    def test_import_package(self):
+        self.assertFalse(self._loaded_after('import awstestutils'))
+
+    def test_import_fixture(self):
+        self.assertFalse(self._loaded_after(
+            'from awstestutils import LiveTestQueue, LiveTestTopicQueue, '
+            'LiveTestDynamoDBTable, cleanup'))
+
+    def test_use_fixture(self):
+        self.assertTrue(self._loaded_after(
+            'import awstestutils; '
+            'awstestutils.LiveTestQueue(region_name="us-west-1")'))
+
+    def test_exports(self):
+        import awstestutils
+        for name in awstestutils.__all__:
+            self.assertTrue(hasattr(awstestutils, name))
+        self.assertTrue(callable(awstestutils.cleanup))
+        with self.assertRaises(AttributeError):
+            awstestutils.missing
 
 
 class LiveTestBoto3ResourceTestCase(unittest.TestCase):
@@ -101,6 +140,36 @@ class LiveTestQueueTestCase(unittest.TestCase):
         num_queues = self._count_sqs_queues(live.sqs)
         self.assertEqual(num_queues, 0)
 
+    def test_receive(self):
+        live = LiveTestQueue(region_name=self.region_name)
+        live.create_queue()
+        try:
+            live.queue.send_message(MessageBody='test text')
+            msgs = live.receive(attribute_names=['SentTimestamp'])
+            self.assertEqual(len(msgs), 1)
+            self.assertEqual(msgs[0].body, 'test text')
+            self.assertIn('SentTimestamp', msgs[0].attributes)
+            live.acknowledge(msgs)
+            self.assertEqual(live.receive(), [])
+        finally:
+            live.destroy_queue()
+
+    def test_drain(self):
+        live = LiveTestQueue(region_name=self.region_name)
+        live.create_queue()
+        try:
+            for start in range(0, 25, 10):
+                live.queue.send_messages(Entries=[
+                    {'Id': str(i), 'MessageBody': str(i)}
+                    for i in range(start, min(start + 10, 25))])
+            bodies = sorted(int(msg.body) for msg in live.drain())
+            self.assertEqual(bodies, list(range(25)))
+            with self.assertRaises(ValueError):
+                live.drain(wait_time_seconds=0)
+            self.assertEqual(live.receive(), [])
+        finally:
+            live.destroy_queue()
+
 
 class LiveTestTopicQueueTestCase(unittest.TestCase):
     def setUp(self):
@@ -142,6 +211,96 @@ class LiveTestTopicQueueTestCase(unittest.TestCase):
         payload = json.loads(msgs[0].body)['Message']
         self.assertEqual(payload, 'some')
 
+    def test_receive_notification(self):
+        live = LiveTestTopicQueue(region_name=self.region_name)
+        live.create_topic_and_queue()
+        try:
+            live.topic.publish(Message='some')
+            time.sleep(1)
+            msgs = list(live.drain())
+        finally:
+            live.destroy_topic_and_queue()
+        self.assertEqual(len(msgs), 1)
+        self.assertEqual(msgs[0].message, 'some')
+        self.assertEqual(msgs[0].notification['Type'], 'Notification')
+
+    def test_probe_delivery(self):
+        live = LiveTestTopicQueue(region_name=self.region_name)
+        live.create_topic_and_queue()
+        try:
+            report = live.probe_delivery(rate=50, count=20, timeout=10)
+        finally:
+            live.destroy_topic_and_queue()
+        self.assertEqual(report.sent, 20)
+        self.assertEqual(report.received, 20)
+        self.assertEqual(report.lost, 0)
+        self.assertEqual(report.duplicates, 0)
+        self.assertLessEqual(report.percentile(50), report.percentile(99))
+        exported = json.loads(report.to_json())
+        self.assertEqual(sum(exported['histogram_ms'].values()), 20)
+        self.assertEqual(exported['latency_ms']['max'], report.latencies[-1])
+
+
+class DeliveryProbeTestCase(unittest.TestCase):
+    def setUp(self):
+        self.probe = DeliveryProbe(live=None, count=1)
+
+    def test_invalid_rate(self):
+        for rate in (0, -1):
+            with self.assertRaises(ValueError):
+                DeliveryProbe(live=None, rate=rate)
+
+    def test_record_skips_foreign_messages(self):
+        bodies = [
+            'not json',
+            json.dumps({'Type': 'Notification'}),
+            json.dumps({'Message': json.dumps([1, 2])}),
+            json.dumps({'Message': json.dumps({'probe': 'other', 'seq': 0, 'sent': 0})}),
+            json.dumps({'Message': json.dumps({'probe': self.probe.probe_id})}),
+            json.dumps(['raw', 'delivery']),
+        ]
+        for body in bodies:
+            self.probe._record(ReceivedMessage(body, 'handle'), time.time())
+        self.assertEqual(self.probe._latencies, [])
+
+    def test_record(self):
+        sent = time.time()
+        body = json.dumps({'Message': json.dumps(
+            {'probe': self.probe.probe_id, 'seq': 0, 'sent': sent})})
+        for _ in range(2):
+            self.probe._record(ReceivedMessage(body, 'handle'), sent + 0.5)
+        self.assertEqual(len(self.probe._latencies), 1)
+        self.assertAlmostEqual(self.probe._latencies[0], 500, places=3)
+        self.assertEqual(self.probe._deliveries[0], 2)
+
+
+class DeliveryReportTestCase(unittest.TestCase):
+    def setUp(self):
+        self.report = DeliveryReport(sent=12, latencies=list(range(100, 0, -10)),
+                                     lost=2, duplicates=1)
+
+    def test_percentiles(self):
+        self.assertEqual(self.report.latencies[0], 10)
+        self.assertEqual(self.report.percentile(50), 50)
+        self.assertEqual(self.report.percentile(99), 100)
+        self.assertEqual(self.report.percentile(0), 10)
+
+    def test_histogram(self):
+        histogram = self.report.histogram(bounds=(25, 50))
+        self.assertEqual(histogram, {'25': 2, '50': 3, 'inf': 5})
+
+    def test_to_dict(self):
+        exported = self.report.to_dict()
+        self.assertEqual(exported['received'], 10)
+        self.assertEqual(exported['lost'], 2)
+        self.assertEqual(exported['duplicates'], 1)
+        self.assertEqual(exported['latency_ms']['max'], 100)
+
+    def test_empty(self):
+        report = DeliveryReport(sent=5, latencies=[], lost=5, duplicates=0)
+        self.assertIsNone(report.percentile(50))
+        self.assertIsNone(report.to_dict()['latency_ms']['p99'])
+
 
 class LiveTestDynamoDBTableTestCase(unittest.TestCase):
     def setUp(self):
@@ -189,3 +348,424 @@ class LiveTestDynamoDBTableTestCase(unittest.TestCase):
             testing_item = response['Item']
             self.assertEqual(item, testing_item)
             testing_table = None
+
+    def test_capture_stream(self):
+        live = LiveTestDynamoDBTable(region_name=self.region_name,
+                                     stream_view_type='NEW_AND_OLD_IMAGES')
+        live.create_table()
+        try:
+            with live.capture_stream() as capture:
+                for i in range(5):
+                    live.table.put_item(Item={'string_key': 'key', 'numeric_key': i})
+                records = capture.wait_for(count=5)
+        finally:
+            live.destroy_table()
+        self.assertEqual([r['eventName'] for r in records], ['INSERT'] * 5)
+        keys = sorted(int(r['dynamodb']['Keys']['numeric_key']['N']) for r in records)
+        self.assertEqual(keys, list(range(5)))
+
+    def test_capture_stream_predicate(self):
+        live = LiveTestDynamoDBTable(region_name=self.region_name,
+                                     stream_view_type='KEYS_ONLY')
+        live.create_table(stream_view_type=live.stream_view_type)
+        try:
+            with live.capture_stream() as capture:
+                live.table.put_item(Item={'string_key': 'key', 'numeric_key': 0})
+                live.table.delete_item(Key={'string_key': 'key', 'numeric_key': 0})
+                records = capture.wait_for(
+                    predicate=lambda r: r['eventName'] == 'REMOVE')
+                with self.assertRaises(TimeoutError):
+                    capture.wait_for(count=1, timeout=1)
+        finally:
+            live.destroy_table()
+        self.assertEqual([r['eventName'] for r in records], ['INSERT', 'REMOVE'])
+
+    def test_capture_stream_lineage(self):
+        # A parent shard, closed with two records, split into two children.
+        shards = {
+            'parent': (None, ['p1', 'p2']),
+            'child-a': ('parent', ['a1']),
+            'child-b': ('parent', ['b1']),
+        }
+
+        class Streams:
+            def describe_stream(self, StreamArn):
+                return {'StreamDescription': {'Shards': [
+                    {'ShardId': shard_id, 'ParentShardId': parent}
+                    for shard_id, (parent, _) in shards.items()]}}
+
+            def get_shard_iterator(self, StreamArn, ShardId, ShardIteratorType):
+                return {'ShardIterator': ShardId}
+
+            def get_records(self, ShardIterator):
+                time.sleep(0.1)
+                return {'Records': shards[ShardIterator][1]}
+
+        capture = StreamCapture('arn', region_name=self.region_name)
+        capture.streams = Streams()
+        with capture:
+            records = capture.wait_for(count=4)
+        self.assertEqual(records[:2], ['p1', 'p2'])
+        self.assertEqual(sorted(records[2:]), ['a1', 'b1'])
+
+    def test_capture_stream_latest(self):
+        # On start: a closed parent and its open child. The child then closes,
+        # and a grandchild shows up.
+        shards = [
+            {'ShardId': 'parent', 'SequenceNumberRange': {
+                'StartingSequenceNumber': '1', 'EndingSequenceNumber': '2'}},
+            {'ShardId': 'child', 'ParentShardId': 'parent',
+             'SequenceNumberRange': {'StartingSequenceNumber': '3'}},
+        ]
+        records = {'parent': ['p1'], 'child': ['c1'], 'grandchild': ['g1']}
+
+        class Streams:
+            def describe_stream(self, StreamArn):
+                return {'StreamDescription': {'Shards': list(shards)}}
+
+            def get_shard_iterator(self, StreamArn, ShardId, ShardIteratorType):
+                time.sleep(0.5)
+                iterator_types[ShardId] = ShardIteratorType
+                return {'ShardIterator': ShardId}
+
+            def get_records(self, ShardIterator):
+                if ShardIterator == 'child':
+                    shards.append({'ShardId': 'grandchild',
+                                   'ParentShardId': 'child',
+                                   'SequenceNumberRange': {
+                                       'StartingSequenceNumber': '5'}})
+                return {'Records': records[ShardIterator]}
+
+        iterator_types = {}
+        capture = StreamCapture('arn', region_name=self.region_name,
+                                iterator_type='LATEST')
+        capture.streams = Streams()
+        with capture:
+            # The open shard has its iterator once started.
+            self.assertEqual(iterator_types, {'child': 'LATEST'})
+            seen = capture.wait_for(count=2, timeout=5)
+        self.assertEqual(seen, ['c1', 'g1'])
+        # The closed parent is skipped, the new shard read from its start.
+        self.assertEqual(iterator_types, {'child': 'LATEST',
+                                          'grandchild': 'TRIM_HORIZON'})
+
+    def test_capture_stream_more_shards_than_workers(self):
+        # Ten open shards, each with one record, read by two workers.
+        class Streams:
+            def describe_stream(self, StreamArn):
+                return {'StreamDescription': {'Shards': [
+                    {'ShardId': 'shard-%d' % i} for i in range(10)]}}
+
+            def get_shard_iterator(self, StreamArn, ShardId, ShardIteratorType):
+                return {'ShardIterator': '%s:0' % ShardId}
+
+            def get_records(self, ShardIterator):
+                shard_id, position = ShardIterator.split(':')
+                records = [shard_id] if position == '0' else []
+                return {'Records': records, 'NextShardIterator': '%s:1' % shard_id}
+
+        capture = StreamCapture('arn', region_name=self.region_name,
+                                max_workers=2)
+        capture.streams = Streams()
+        with capture:
+            records = capture.wait_for(count=10, timeout=5)
+        self.assertEqual(sorted(records), sorted('shard-%d' % i for i in range(10)))
+
+    def test_capture_stream_wait_for_deadline(self):
+        # One open shard, with a record at about 0.75 seconds.
+        class Streams:
+            def describe_stream(self, StreamArn):
+                return {'StreamDescription': {'Shards': [{'ShardId': 'shard'}]}}
+
+            def get_shard_iterator(self, StreamArn, ShardId, ShardIteratorType):
+                return {'ShardIterator': '0'}
+
+            def get_records(self, ShardIterator):
+                if ShardIterator == '0':
+                    time.sleep(0.75)
+                    return {'Records': ['r1'], 'NextShardIterator': '1'}
+                return {'Records': [], 'NextShardIterator': '1'}
+
+        capture = StreamCapture('arn', region_name=self.region_name)
+        capture.streams = Streams()
+        with capture:
+            start = time.monotonic()
+            with self.assertRaises(TimeoutError):
+                capture.wait_for(predicate=lambda record: False, timeout=1)
+            self.assertLess(time.monotonic() - start, 1.5)
+
+    def test_capture_stream_without_stream(self):
+        live = LiveTestDynamoDBTable(region_name=self.region_name)
+        live.create_table()
+        try:
+            with self.assertRaises(ValueError):
+                live.capture_stream()
+        finally:
+            live.destroy_table()
+
+
+class LiveTestS3BucketTestCase(unittest.TestCase):
+    def setUp(self):
+        self.region_name = 'us-west-1'
+
+    def _count_objects(self, bucket):
+        return len(list(bucket.object_versions.all()))
+
+    def test_use_bucket(self):
+        s3 = boto3.resource('s3', region_name=self.region_name)
+        with LiveTestS3Bucket(region_name=self.region_name) as bucket:
+            bucket_name = bucket.name
+            bucket.put_object(Key='some', Body=b'data')
+            self.assertIn(bucket_name, [b.name for b in s3.buckets.all()])
+        self.assertNotIn(bucket_name, [b.name for b in s3.buckets.all()])
+
+    def test_exists_taken_elsewhere(self):
+        from botocore.exceptions import ClientError
+        live = LiveTestS3Bucket(region_name=self.region_name)
+        for code in ('403', '301'):
+            def head_bucket(Bucket, code=code):
+                raise ClientError({'Error': {'Code': code}}, 'HeadBucket')
+            live.s3.meta.client.head_bucket = head_bucket
+            self.assertTrue(live.exists('test-1'))
+
+    def test_name(self):
+        live = LiveTestS3Bucket(region_name=self.region_name)
+        live.exists = lambda name: False
+        self.assertEqual(len(live.generate_name()), len('test-') + 12)
+
+    def test_seed_and_empty(self):
+        live = LiveTestS3Bucket(region_name=self.region_name)
+        live.create_bucket()
+        try:
+            live.seed(('object-%d' % i, b'data') for i in range(2500))
+            self.assertEqual(self._count_objects(live.bucket), 2500)
+            live.empty()
+            self.assertEqual(self._count_objects(live.bucket), 0)
+        finally:
+            live.destroy_bucket()
+
+    def test_empty_versioned(self):
+        live = LiveTestS3Bucket(region_name=self.region_name, versioning=True)
+        live.create_bucket()
+        try:
+            live.seed(('object-%d' % (i % 10), b'data') for i in range(30))
+            live.bucket.Object('object-0').delete()
+            # 30 versions and one delete marker.
+            self.assertEqual(self._count_objects(live.bucket), 31)
+            live.empty()
+            self.assertEqual(self._count_objects(live.bucket), 0)
+        finally:
+            live.destroy_bucket()
+
+    def test_seed_files(self):
+        directory = tempfile.mkdtemp()
+        small, large = os.path.join(directory, 'small'), os.path.join(directory, 'large')
+        with open(small, 'wb') as f:
+            f.write(b'small')
+        large_data = os.urandom(11 * 1024 * 1024)
+        with open(large, 'wb') as f:
+            f.write(large_data)
+        live = LiveTestS3Bucket(region_name=self.region_name)
+        live.create_bucket()
+        try:
+            live.seed_files([('small', small), ('large', large)],
+                            multipart_threshold=5 * 1024 * 1024,
+                            part_size=5 * 1024 * 1024)
+            self.assertEqual(live.bucket.Object('small').get()['Body'].read(), b'small')
+            self.assertEqual(live.bucket.Object('large').get()['Body'].read(), large_data)
+        finally:
+            live.destroy_bucket()
+
+
+    def test_seed_files_aborts_on_failed_completion(self):
+        from botocore.exceptions import ClientError
+        path = os.path.join(tempfile.mkdtemp(), 'large')
+        with open(path, 'wb') as f:
+            f.write(os.urandom(6 * 1024 * 1024))
+        live = LiveTestS3Bucket(region_name=self.region_name)
+        live.create_bucket()
+        client = live.s3.meta.client
+        try:
+            def complete_multipart_upload(**kwargs):
+                raise ClientError({'Error': {'Code': 'InternalError'}},
+                                  'CompleteMultipartUpload')
+            client.complete_multipart_upload = complete_multipart_upload
+            with self.assertRaises(ClientError):
+                live.seed_files([('large', path)],
+                                multipart_threshold=5 * 1024 * 1024,
+                                part_size=5 * 1024 * 1024)
+            uploads = client.list_multipart_uploads(Bucket=live.bucket_name)
+            self.assertEqual(uploads.get('Uploads', []), [])
+        finally:
+            live.destroy_bucket()
+
+    def test_seed_files_part_size(self):
+        live = LiveTestS3Bucket(region_name=self.region_name)
+        with self.assertRaises(ValueError):
+            live.seed_files([], part_size=1024 * 1024)
+
+class ResourceBrokerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.region_name = 'us-west-1'
+        self.socket_path = os.path.join(tempfile.mkdtemp(), 'broker.sock')
+        self.broker = ResourceBroker(self.socket_path, lease_timeout=1)
+        self.thread = threading.Thread(target=self.broker.serve_forever)
+        self.thread.start()
+        self.broker.ready.wait()
+
+    def tearDown(self):
+        self.broker.shutdown()
+        self.thread.join()
+
+    def test_queue_reused_and_reset(self):
+        with LiveTestQueue(region_name=self.region_name,
+                           broker=self.socket_path) as queue:
+            first_url = queue.url
+            queue.send_message(MessageBody='left over')
+        self.broker.wait_until_reset()
+        with LiveTestQueue(region_name=self.region_name,
+                           broker=self.socket_path) as queue:
+            self.assertEqual(queue.url, first_url)
+            msgs = queue.receive_messages()
+        self.assertEqual(len(msgs), 0)
+
+    def test_queue_reset_waits_for_in_flight(self):
+        with LiveTestQueue(region_name=self.region_name,
+                           broker=self.socket_path) as queue:
+            first_url = queue.url
+            queue.send_message(MessageBody='in flight')
+            # Received but never deleted, so it comes back after 2 seconds.
+            self.assertEqual(len(queue.receive_messages(VisibilityTimeout=2)), 1)
+        self.broker.wait_until_reset()
+        with LiveTestQueue(region_name=self.region_name,
+                           broker=self.socket_path) as queue:
+            self.assertEqual(queue.url, first_url)
+            time.sleep(3)
+            msgs = queue.receive_messages()
+        self.assertEqual(len(msgs), 0)
+
+    def test_topic_queue_leased(self):
+        with LiveTestTopicQueue(region_name=self.region_name,
+                                broker=self.socket_path) as (topic, queue):
+            topic.publish(Message='some')
+            time.sleep(1)
+            msgs = queue.receive_messages()
+            for msg in msgs:
+                msg.delete()
+        self.assertEqual(len(msgs), 1)
+        self.assertEqual(json.loads(msgs[0].body)['Message'], 'some')
+
+    def test_table_reused_and_reset(self):
+        with LiveTestDynamoDBTable(region_name=self.region_name,
+                                   broker=self.socket_path) as table:
+            first_name = table.name
+            table.put_item(Item={'string_key': 'key1', 'numeric_key': 0})
+        self.broker.wait_until_reset()
+        with LiveTestDynamoDBTable(region_name=self.region_name,
+                                   broker=self.socket_path) as table:
+            self.assertEqual(table.name, first_name)
+            self.assertEqual(table.scan()['Count'], 0)
+
+    def test_bucket_reused_and_reset(self):
+        with LiveTestS3Bucket(region_name=self.region_name,
+                              broker=self.socket_path) as bucket:
+            first_name = bucket.name
+            bucket.put_object(Key='some', Body=b'data')
+        self.broker.wait_until_reset()
+        with LiveTestS3Bucket(region_name=self.region_name,
+                              broker=self.socket_path) as bucket:
+            self.assertEqual(bucket.name, first_name)
+            self.assertEqual(len(list(bucket.objects.all())), 0)
+
+    def test_prefilled_resources_leased(self):
+        self.broker.prefill({'queue': 1, 'table': 1})
+        dynamodb = boto3.resource('dynamodb', region_name=self.region_name)
+        sqs = boto3.resource('sqs', region_name=self.region_name)
+        table_names = [table.name for table in dynamodb.tables.all()]
+        queue_urls = [queue.url for queue in sqs.queues.all()]
+        # Default settings, the broker and the client resolve the same region.
+        with LiveTestDynamoDBTable(broker=self.socket_path) as table:
+            self.assertEqual([table.name], table_names)
+        with LiveTestQueue(region_name=self.region_name,
+                           broker=self.socket_path) as queue:
+            self.assertEqual([queue.url], queue_urls)
+        self.assertEqual(len(list(dynamodb.tables.all())), 1)
+        self.assertEqual(len(list(sqs.queues.all())), 1)
+
+    def test_lease_reclaimed_on_disconnect(self):
+        client = BrokerClient(self.socket_path)
+        _, first = client.lease('queue', region_name=self.region_name)
+        client.close()
+        time.sleep(0.1)
+        self.broker.wait_until_reset()
+        client = BrokerClient(self.socket_path)
+        _, second = client.lease('queue', region_name=self.region_name)
+        client.close()
+        self.assertEqual(first, second)
+
+    def test_lease_reclaimed_without_heartbeats(self):
+        client = BrokerClient(self.socket_path)
+        # Stop the heartbeats, but keep the connection open.
+        client._closed.set()
+        lease_id, _ = client.lease('queue', region_name=self.region_name)
+        time.sleep(2)
+        with self.assertRaises(RuntimeError):
+            client.release(lease_id)
+        client.close()
+
+    def test_slow_reset_keeps_other_leases(self):
+        create, reset, destroy = broker.KINDS['queue']
+
+        def slow_reset(manager):
+            time.sleep(3)
+            reset(manager)
+
+        broker.KINDS['queue'] = (create, slow_reset, destroy)
+        try:
+            client = BrokerClient(self.socket_path)
+            first, _ = client.lease('queue', region_name=self.region_name)
+            second, _ = client.lease('queue', region_name=self.region_name)
+            start = time.monotonic()
+            client.release(first)
+            self.assertLess(time.monotonic() - start, 1)
+            # Longer than the lease timeout, while the first queue is reset.
+            time.sleep(2)
+            client.release(second)
+            client.close()
+            self.broker.wait_until_reset()
+        finally:
+            broker.KINDS['queue'] = (create, reset, destroy)
+
+    def test_shutdown_waits_for_reset(self):
+        create, reset, destroy = broker.KINDS['queue']
+        resets = []
+
+        def slow_reset(manager):
+            time.sleep(2)
+            reset(manager)
+            resets.append(manager)
+
+        broker.KINDS['queue'] = (create, slow_reset, destroy)
+        try:
+            client = BrokerClient(self.socket_path)
+            lease_id, _ = client.lease('queue', region_name=self.region_name)
+            client.release(lease_id)
+            client.close()
+            with self.assertNoLogs('awstestutils.broker', level='WARNING'):
+                self.broker.shutdown()
+                self.thread.join()
+        finally:
+            broker.KINDS['queue'] = (create, reset, destroy)
+        self.assertEqual(len(resets), 1)
+        sqs = boto3.resource('sqs', region_name=self.region_name)
+        self.assertEqual(len(list(sqs.queues.all())), 0)
+
+    def test_resources_destroyed_on_shutdown(self):
+        with LiveTestQueue(region_name=self.region_name,
+                           broker=self.socket_path):
+            pass
+        sqs = boto3.resource('sqs', region_name=self.region_name)
+        self.assertEqual(len(list(sqs.queues.all())), 1)
+        self.broker.shutdown()
+        self.thread.join()
+        self.assertEqual(len(list(sqs.queues.all())), 0)